@@ -1,10 +1,31 @@
 import os
-import re
+import sys
 from pathlib import Path
+import argparse
 import csv
 import logging
-
-from render_pdf import renderClientPDF, renderAverageBaseline
+import pickle
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from archive_tree import ArchiveCatalog, archiveStem, isArchive, physicalPath
+from baseline_aggregate import BaselineAggregator
+from batch_coordinator import COHORT, LEASE_SECONDS, BatchCoordinator
+from client_data import ClientData
+from client_tensor import ClientTensor, clientTensorPath
+from cohort_matrix import CohortMatrix, writeCohortStatistics
+from folder_watch import POLL_SECONDS, SETTLE_SECONDS, FolderWatch
+from input_catalog import InputCatalog, findClientFolders, scanClient
+from ion_scan import IonScan
+from quarantine import Quarantine, quarantinedClients, quarantinedFiles
+from read_ahead import readAhead
+from results_warehouse import ResultsWarehouse
+from run_metrics import RunMetrics, addMetric, measured, timed
+from scan_cache import ScanCache
+from scan_compare import compareTimepoints, writeDeltaTable
+from scan_parser import (lineOffsets, mappedFile, parseMetaboliteText, parseScanBlockText, scanBlockProblem, scanBlockText,
+                         summaryProblem, summaryText)
 
 # --------------
 # VARIABLES
@@ -13,88 +34,201 @@ from render_pdf import renderClientPDF, renderAverageBaseline
 ROOT = "/Users/school/Downloads/Chem-H Metabolite data and Mass Scans/"
 OUTPUT_FOLDER = Path(ROOT) / "results"
 
+# Running sums of every client baseline, kept between runs
+BASELINE_STATE_FILE = "averageBaseline-state.json"
+
+# Clients x ions matrix of every baseline, memory-mappable for cohort statistics
+BASELINE_MATRIX_FILE = "baselineMatrix.npy"
+
+# Parsed scans are cached under the results folder, keyed by file content
+SCAN_CACHE_FOLDER = "cache"
+SCAN_CACHE_MAX_BYTES = 2 * 1024 ** 3  # 0 disables the cache
+
+# Time points kept by the mass scan and metabolite finders, None keeps every one
+MASS_SCAN_TIMES = [30]
+METABOLITE_TIMES = [-3, -7, 0, 30]
+
+# Per-client time x ion arrays of every time point, under results/tensors
+WRITE_TENSORS = True
+
+# Per-client CSVs are optional, reports render straight from the parsed data
+WRITE_CSV = True
+
+# Reports per client, and/or one cohort PDF with a page per client
+CLIENT_REPORTS = True
+COHORT_REPORT = False
+
+# Only CSVs and arrays, no PDFs, reportlab is then never imported
+DATA_ONLY = False
+
+# Scan files each client reads ahead of parsing, bounds the memory held waiting
+READ_AHEAD = 4
+
+# Number of client folders processed in parallel
+WORKERS = os.cpu_count()
+
+# Number of processes rendering PDFs, separate from the data stages
+RENDER_WORKERS = os.cpu_count()
+
+# Parsed per-client data, the hand-off between the parse and render stages
+CLIENT_DATA_FOLDER = "clients"
+
+# Stages after discovery, each is skipped when its outputs are newer than its inputs
+STAGES = ["parse", "aggregate", "render"]
+
+# Exports rejected as broken, one manifest per client, skipped until they change
+QUARANTINE_FOLDER = "quarantine"
+
+# Optional SQLite store of every client's intensities and concentrations, for indexed cohort queries
+WAREHOUSE = False
+WAREHOUSE_FILE = "results.sqlite"
+
+# Per-run timings and counters are written here under the results folder, with any profiles
+METRICS_FOLDER = "metrics"
+
+# --watch retries a client that failed this many times, waiting longer each time, then waits for its exports to change
+WATCH_RETRIES = 3
+
+# Source files whose changes make a stage's outputs stale
+PARSE_SOURCES = [Path(__file__).parent / name for name in (
+    "al_syft.py", "client_data.py", "input_catalog.py", "ion_scan.py", "scan_cache.py", "scan_compare.py", "scan_parser.py",
+)]
+RENDER_SOURCES = [Path(__file__).parent / name for name in (
+    "render_pdf.py", "chart_data.py", "scan_compare.py", "Montserrat.ttf",
+)]
+
 # --------------
 
+scanCaches = {}
+quarantines = {}
+
+FetchedFile = namedtuple('FetchedFile', ['entryPath', 'cached', 'value', 'problem'])
+ClientResult = namedtuple('ClientResult', ['baselineData', 'scan30Data', 'metabolites', 'comparisons', 'outputPdf'])
+
 logging.basicConfig(format='[ %(levelname)s ] - %(message)s', level=logging.INFO)
 
 
-def process_file(fileName):
-    logging.info(f"Processing file {fileName}")
-    data = []
+def scanCacheFor(outputPath):
+    if SCAN_CACHE_MAX_BYTES == 0:
+        return None
 
-    with open(fileName, 'r') as f:
-        reader = csv.reader(f)
-        data = list(reader)
+    cacheDir = Path(outputPath) / SCAN_CACHE_FOLDER
+    if cacheDir not in scanCaches:
+        scanCaches[cacheDir] = ScanCache(cacheDir, SCAN_CACHE_MAX_BYTES)
+        scanCaches[cacheDir].invalidate()
+    return scanCaches[cacheDir]
 
-    data = data[266:1424]
 
-    # Skip Incomplete  Files
-    for row in data:
-        if row[0] == '':
-            logging.warning("File Incomplete")
-            return None
+def quarantineFor(outputPath, clientFolder):
+    manifestPath = Path(outputPath) / QUARANTINE_FOLDER / (clientFolder + ".json")
+    if manifestPath not in quarantines:
+        quarantines[manifestPath] = Quarantine(manifestPath)
+    return quarantines[manifestPath]
 
-    row_len = data[0].index(':')
 
-    data = list([row[:row_len] for row in data])
+@timed("fetchScanFile")
+def fetchScanFile(fileName, kind, cache=None, quarantine=None, members=None):
+    # The I/O half of parsing, either a known result or the text the parser needs
+    if members is not None and fileName in members:
+        # Already read from an archive, bytes work the same as a mapping
+        return FetchedFile(None, False, *fetchMapped(members[fileName], kind))
 
-    data = {
-        (int(reagent), int(product)): list(map(float, intensities)) for reagent, product, *intensities in data
-    }
+    if quarantine is not None:
+        reason = quarantine.reason(fileName, kind)
+        if reason is not None:
+            return FetchedFile(None, True, None, reason)
 
-    # Manually Filter Some Combinations
-    filters = {
-        19: (19, 37),
-        30: (30,),
-        32: (32,),
-    }
+    # Mapped first, so a file the cache hasn't seen is hashed from the same mapping it is parsed from
+    with mappedFile(fileName) as mapped:
+        entryPath = None
+        if cache is not None:
+            (entryPath, found, value) = cache.lookup(fileName, kind, mapped)
+            if found:
+                return FetchedFile(entryPath, True, value, None)
+
+        return FetchedFile(entryPath, False, *fetchMapped(mapped, kind))
+
+
+def fetchMapped(mapped, kind):
+    # Only the ion block, or the Summary section, is decoded, returns (text, problem)
+    if kind == 'scan':
+        # Lines are only indexed up to the end of the ion block, cheap enough to redo on every miss
+        offsets = lineOffsets(mapped)
+        problem = scanBlockProblem(mapped, offsets)
+        return (scanBlockText(mapped, offsets) if problem is None else None, problem)
+
+    problem = summaryProblem(mapped)
+    return (summaryText(mapped) if problem is None else None, problem)
 
-    for reagent, products in filters.items():
-        for product in products:
-            if (reagent, product) in data:
-                del data[(reagent, product)]
 
-    for key in data.keys():
-        data[key] = [sum(data[key]) / len(data[key])]
+def readAheadFiles(items, kind, cache=None, quarantine=None, path=lambda item: item, members=None):
+    return readAhead(items, lambda item: fetchScanFile(path(item), kind, cache, quarantine, members), READ_AHEAD)
 
-    return data
 
-def process_metabolite_file(fileName):
+def rejectFile(fileName, kind, fetched, quarantine=None):
+    addMetric("quarantinedFiles")
+
+    if fetched.cached:
+        logging.info(f"Skipping quarantined {fileName}: {fetched.problem}")
+        return
+
+    logging.warning(f"Quarantining {fileName}: {fetched.problem}")
+    if quarantine is not None:
+        quarantine.add(fileName, kind, fetched.problem)
+
+
+@timed("process_file")
+def process_file(fileName, cache=None, fetched=None, quarantine=None):
     logging.info(f"Processing file {fileName}")
-    data = []
-    with open(fileName, 'r') as f:
-        reader = csv.reader(f)
-        data = list(reader)
 
-    dataSummary = None
+    if fetched is None:
+        fetched = fetchScanFile(fileName, 'scan', cache, quarantine)
 
-    for i, row in enumerate(data):
-        if row[0] == 'Summary':
-            dataSummary = data[i + 3:]
+    if fetched.problem is not None:
+        rejectFile(fileName, 'scan', fetched, quarantine)
+        return None
 
-    if dataSummary is None:
-        logging.warning("File Incomplete")
+    if fetched.cached:
+        scan = fetched.value
+    else:
+        scan = parseScanBlockText(fetched.value)
+        if fetched.entryPath is not None:
+            cache.put(fetched.entryPath, 'scan', scan)
+
+    if scan is None:
+        addMetric("incompleteFiles")
+        if quarantine is not None:
+            quarantine.add(fileName, 'scan', "incomplete ion block")
         return None
 
-    scanResults = {
-        'acetone': None,
-        'ammonia': None,
-        'isoprene': None,
-        'lactic acid': None
-    }
+    return IonScan.fromArrays(scan.reagents, scan.products, scan.mean)
 
-    for row in dataSummary:
-        analyte, concentration = row[0], float(row[1])
+@timed("process_metabolite_file")
+def process_metabolite_file(fileName, cache=None, fetched=None, quarantine=None):
+    logging.info(f"Processing file {fileName}")
 
-        if analyte in scanResults:
-            scanResults[analyte] = concentration
+    if fetched is None:
+        fetched = fetchScanFile(fileName, 'metabolite', cache, quarantine)
 
-    if any([value is None for value in scanResults.values()]):
-        logging.warning("File Incomplete")
+    if fetched.problem is not None:
+        rejectFile(fileName, 'metabolite', fetched, quarantine)
         return None
 
+    if fetched.cached:
+        scanResults = fetched.value
+    else:
+        scanResults = parseMetaboliteText(fetched.value)
+        if fetched.entryPath is not None:
+            cache.put(fetched.entryPath, 'metabolite', scanResults)
+
+    if scanResults is None:
+        addMetric("incompleteFiles")
+        if quarantine is not None:
+            quarantine.add(fileName, 'metabolite', "incomplete Summary section")
+
     return scanResults
 
+@timed("catenateFilesWithAverage")
 def catenateFilesWithAverage(fileNames, fileDatas):
     newData = {}
     for fileData in fileDatas:
@@ -117,7 +251,9 @@ def catenateFilesWithAverage(fileNames, fileDatas):
 
 def readFileData(filePath):
     data = []
-    output = {}
+    reagents = []
+    products = []
+    intensities = []
     with open(filePath, 'r') as f:
         reader = csv.reader(f)
         data = list(reader)
@@ -127,12 +263,15 @@ def readFileData(filePath):
             return {}
 
         reagent, product, intensity, *other = row
-        output[(int(reagent), int(product))] = [float(intensity)]
+        reagents.append(int(reagent))
+        products.append(int(product))
+        intensities.append(float(intensity))
 
-    return output
+    return IonScan.fromArrays(reagents, products, intensities)
 
 
 
+@timed("writeFileDatas")
 def writeFileDatas(outputPath, outputName, columnNames, fileDatas):
     outputFilePath = Path(outputPath) / (outputName + '.csv')
 
@@ -142,58 +281,29 @@ def writeFileDatas(outputPath, outputName, columnNames, fileDatas):
         for (reagent, product), values in fileDatas.items():
             writer.writerow([reagent, product, *values])
 
-def findBaselineFilenames(clientDirectoryName, rootDir):
+@timed("findBaselineFilenames")
+def findBaselineFilenames(clientDirectoryName, rootDir, clientFiles=None):
     logging.info(f"Processing {clientDirectoryName}")
 
-    clientPath = Path(rootDir) / clientDirectoryName
-
-    baselineFiles = []
-
-    for item in os.listdir(clientPath):
-        filename = os.path.join(clientPath, item)
+    if clientFiles is None:
+        clientFiles = scanClient(clientDirectoryName, rootDir)
 
-        if os.path.isfile(filename):
-            continue
-
-        if (re.match(r'0.*baseline.*', item.lower()) or re.match(r'2.*mass.*', item.lower())):
-            baselineFiles.extend([os.path.join(filename, f) for f in os.listdir(filename)])
-
-    def baselineFilenameFilter(fileName):
-        if not fileName.endswith('.csv'):
-            return False
-
-        # Manually Filter out relevant files
-        # Adjust if needed
-        for item in [
-            'baseline',
-            ' 0min',
-            ' 0 min',
-            'neg3',
-            'neg7',
-            'neg 3',
-            'neg 7',
-            ' -3 ',
-            ' -7 ',
-            ' -3min',
-            ' -7min',
-        ]:
-            if item.lower() in fileName.lower():
-                return True
+    return list(clientFiles.baseline)
 
-        return False
 
-    baselineFiles = list(filter(baselineFilenameFilter, baselineFiles))
-    return baselineFiles
-
-
-def processBaseline(clientDirectoryName, rootDir, outputPath):
+def processBaseline(clientDirectoryName, rootDir, outputPath, writeCsv=True, clientFiles=None):
     successfulFileName = []
     successfulFileData = []
 
-    files_to_process = findBaselineFilenames(clientDirectoryName, rootDir)
+    files_to_process = findBaselineFilenames(clientDirectoryName, rootDir, clientFiles)
+    cache = scanCacheFor(outputPath)
+    quarantine = quarantineFor(outputPath, clientDirectoryName)
 
-    for file in files_to_process:
-        fileData = process_file(file)
+    # Files are read on a background thread while earlier ones are parsed
+    members = clientFiles.members if clientFiles is not None else None
+
+    for file, fetched in readAheadFiles(files_to_process, 'scan', cache, quarantine, members=members):
+        fileData = process_file(file, cache, fetched, quarantine)
 
         if fileData is None:
             continue
@@ -203,69 +313,105 @@ def processBaseline(clientDirectoryName, rootDir, outputPath):
 
     (catenatedFileNames, catenatedFileDatas) = catenateFilesWithAverage(successfulFileName, successfulFileData)
 
-    writeFileDatas(outputPath, clientDirectoryName + "-baseline", catenatedFileNames, catenatedFileDatas)
+    if writeCsv:
+        writeFileDatas(outputPath, clientDirectoryName + "-baseline", catenatedFileNames, catenatedFileDatas)
 
+    return (catenatedFileNames, catenatedFileDatas)
 
 
-def findMassScansFileNames(clientFolder, rootDir):
-    clientPath = Path(rootDir) / clientFolder
-    allDirectoresUnderClient = [os.path.join(clientPath, d) for d in os.listdir(clientPath) if
-                                os.path.isdir(os.path.join(clientPath, d))]
-    allScanFiles = []
-    for subDir in allDirectoresUnderClient:
-        for fileName in os.listdir(os.path.join(subDir, subDir)):
-            res = re.search(r"2-Mass-Scan-pos-neg.* ([0-9]+)min.*\.csv$", fileName)
-            if res is None:
-                continue
-            minutes = int(res.group(1))
-            if minutes == 30:
-                allScanFiles.append((os.path.join(subDir, fileName), minutes))
-    return allScanFiles
 
+@timed("findMassScansFileNames")
+def findMassScansFileNames(clientFolder, rootDir, clientFiles=None, times=MASS_SCAN_TIMES):
+    if clientFiles is None:
+        clientFiles = scanClient(clientFolder, rootDir)
+
+    return [(path, minutes) for path, minutes in clientFiles.massScans if times is None or minutes in times]
+
+
+def processMassScans(clientFolder, rootDir, outputPath, writeCsv=True, clientFiles=None, times=MASS_SCAN_TIMES):
+    allScanPaths = findMassScansFileNames(clientFolder, rootDir, clientFiles, times)
+    cache = scanCacheFor(outputPath)
+    quarantine = quarantineFor(outputPath, clientFolder)
+    massScans = {}
+
+    members = clientFiles.members if clientFiles is not None else None
+
+    for (scanPath, time), fetched in readAheadFiles(allScanPaths, 'scan', cache, quarantine, lambda item: item[0], members):
+        scanData = process_file(scanPath, cache, fetched, quarantine)
+
+        if scanData is None:
+            continue
+
+        massScans[time] = (Path(scanPath).name, scanData)
+
+    if writeCsv:
+        writeMassScans(clientFolder, outputPath, massScans)
+
+    return massScans
 
-def processMassScans(clientFolder, rootDir, outputPath):
-    allScanPaths = findMassScansFileNames(clientFolder, rootDir)
-    clientPath = Path(rootDir) / clientFolder
 
-    for (scanPath,time) in allScanPaths:
-        scanData = process_file(scanPath)
-        fileName = Path(scanPath).name
+def writeMassScans(clientFolder, outputPath, massScans, times=MASS_SCAN_TIMES):
+    for time, (fileName, scanData) in massScans.items():
+        if times is not None and time not in times:
+            continue
+
         outputName = clientFolder + "-" + str(time) + "min"
         writeFileDatas(outputPath, outputName, [fileName], scanData)
 
-def findMetabolitesFileNames(clientFolder, rootDir):
-    clientPath = Path(rootDir) / clientFolder
-    allDirectoresUnderClient = [os.path.join(clientPath, d) for d in os.listdir(clientPath) if
-                                os.path.isdir(os.path.join(clientPath, d))]
-    allScanFiles = []
-    for subDir in allDirectoresUnderClient:
-        for fileName in os.listdir(os.path.join(subDir, subDir)):
-            res = re.search(r"3.* (-?[0-9]+)min.*\.csv$", fileName)
-            if res is None:
-                continue
-            minutes = int(res.group(1))
-            if minutes in [-3, -7, 0, 30]:
-                allScanFiles.append((os.path.join(subDir, fileName), minutes))
-    return allScanFiles
+@timed("findMetabolitesFileNames")
+def findMetabolitesFileNames(clientFolder, rootDir, clientFiles=None, times=METABOLITE_TIMES):
+    if clientFiles is None:
+        clientFiles = scanClient(clientFolder, rootDir)
 
+    return [(path, minutes) for path, minutes in clientFiles.metabolites if times is None or minutes in times]
 
-def processMetabolites(clientFolder, rootDir, outputPath):
-    allScanPaths = findMetabolitesFileNames(clientFolder, rootDir)
 
-    allScanPaths.sort(key=lambda path: path[1], reverse=True)
+def processMetabolites(clientFolder, rootDir, outputPath, writeCsv=True, clientFiles=None, times=METABOLITE_TIMES):
+    allScanPaths = findMetabolitesFileNames(clientFolder, rootDir, clientFiles, times)
 
-    for (scanPath, time) in allScanPaths:
-        scanData = process_metabolite_file(scanPath)
+    cache = scanCacheFor(outputPath)
+    quarantine = quarantineFor(outputPath, clientFolder)
+    metabolites = {}
+
+    members = clientFiles.members if clientFiles is not None else None
+
+    for (scanPath, time), fetched in readAheadFiles(allScanPaths, 'metabolite', cache, quarantine, lambda item: item[0], members):
+        scanData = process_metabolite_file(scanPath, cache, fetched, quarantine)
 
         if scanData is None:
             continue
 
-        outputName = clientFolder + "-metabolite-" + str(time) + "min"
+        metabolites[time] = scanData
+
+    if writeCsv:
+        writeMetabolites(clientFolder, outputPath, metabolites)
+
+    return metabolites
+
+
+def labelMetabolites(metabolites, times=METABOLITE_TIMES):
+    labelled = {}
+
+    # Any negative time is a baseline, the earliest one wins
+    for time in sorted(metabolites, reverse=True):
+        if times is not None and time not in times:
+            continue
+
+        label = str(time) + "min"
 
         if time < 0:
-            outputName = clientFolder + "-metabolite-baseline"
+            label = "baseline"
+
+        labelled[label] = metabolites[time]
+
+    return labelled
+
+
+def writeMetabolites(clientFolder, outputPath, metabolites):
+    for label, scanData in labelMetabolites(metabolites).items():
+        outputName = clientFolder + "-metabolite-" + label
 
-        with open(outputPath / (outputName + '.csv'), 'w') as f:
+        with open(Path(outputPath) / (outputName + '.csv'), 'w') as f:
             writer = csv.writer(f)
             writer.writerow(["Analyte", "Concentration"])
             for analyte, concentration in scanData.items():
@@ -277,39 +423,770 @@ def findAllBaselinesinOutputFolder(outputPath):
     return baselineFiles
 
 
-def computeConsolodatedBaselines(outputPath):
-    allFiles = findAllBaselinesinOutputFolder(outputPath)
-    allFiles.sort()
+def computeConsolodatedBaselines(outputPath, warehouse=None):
     allNames = []
     allDatas = []
-    for file in allFiles:
-        data = readFileData(file)
-        if data != {}:
-            allNames.append(file.stem)
+
+    if warehouse is not None:
+        # One query instead of listing and reading every baseline CSV
+        for clientFolder, data in warehouse.timepoint("baseline").items():
+            allNames.append(clientFolder + "-baseline")
             allDatas.append(data)
+    else:
+        allFiles = findAllBaselinesinOutputFolder(outputPath)
+        allFiles.sort()
+        for file in allFiles:
+            data = readFileData(file)
+            if data != {}:
+                allNames.append(file.stem)
+                allDatas.append(data)
 
     (newNames, newData) = catenateFilesWithAverage(allNames, allDatas)
     writeFileDatas(outputPath, "averageBaseline", newNames, newData)
 
 
-if __name__ == "__main__":
-    OUTPUT_FOLDER.mkdir(parents=True, exist_ok=True)
+def writeAggregatedBaseline(aggregator, outputPath):
+    (newNames, newData) = aggregator.catenated()
+    writeFileDatas(outputPath, "averageBaseline", newNames, newData)
+
+
+def writeClientCsvs(clientFolder, outputPath, baseline, massScans, metabolites):
+    writeFileDatas(outputPath, clientFolder + "-baseline", *baseline)
+    writeMassScans(clientFolder, outputPath, massScans)
+    writeMetabolites(clientFolder, outputPath, metabolites)
 
-    clientFolders = [f for f in os.listdir(ROOT) if re.match(r'AL-\d*', f)]
 
-    for clientFolder in clientFolders:
-        processBaseline(clientFolder, ROOT, OUTPUT_FOLDER)
-        processMassScans(clientFolder, ROOT, OUTPUT_FOLDER)
-        processMetabolites(clientFolder, ROOT, OUTPUT_FOLDER)
+def processClientData(clientFolder, rootDir, outputPath, clientFiles=None):
+    outputPath = Path(outputPath)
 
-        outputBaseline = OUTPUT_FOLDER / (clientFolder +"-baseline.csv")
-        output30min = OUTPUT_FOLDER / (clientFolder +"-30min.csv")
-        outputMetaboliteBaseline = OUTPUT_FOLDER / (clientFolder +"-metabolite-baseline.csv")
-        outputMetabolite30min = OUTPUT_FOLDER / (clientFolder +"-metabolite-30min.csv")
-        renderClientPDF(outputBaseline, output30min, outputMetaboliteBaseline, outputMetabolite30min)
+    # One directory walk serves all three stages
+    if clientFiles is None:
+        clientFiles = scanClient(clientFolder, rootDir)
 
-        computeConsolodatedBaselines(OUTPUT_FOLDER)
-        aveageBaselinePath = OUTPUT_FOLDER / "averageBaseline.csv"
-        renderAverageBaseline(aveageBaselinePath)
+    # Entries left from files the catalog now sees differently, e.g. a scan once taken for a metabolite export
+    quarantineFor(outputPath, clientFolder).retain({
+        'scan': [*clientFiles.baseline, *[path for path, _ in clientFiles.massScans]],
+        'metabolite': [path for path, _ in clientFiles.metabolites],
+    })
 
+    # Every time point is parsed in this one pass, reports pick the ones they need
+    baseline = processBaseline(clientFolder, rootDir, outputPath, writeCsv=False, clientFiles=clientFiles)
+    massScans = processMassScans(clientFolder, rootDir, outputPath, writeCsv=False, clientFiles=clientFiles, times=None)
+    metabolites = processMetabolites(clientFolder, rootDir, outputPath, writeCsv=False, clientFiles=clientFiles, times=None)
 
+    (_, baselineData) = baseline
+    scansByTime = {time: scanData for time, (_, scanData) in massScans.items()}
+    comparisons = compareTimepoints(baselineData, scansByTime)
+
+    if WRITE_TENSORS:
+        tensorPath = clientTensorPath(outputPath, clientFolder)
+        tensorPath.parent.mkdir(parents=True, exist_ok=True)
+        ClientTensor.fromScans(baselineData, scansByTime, metabolites).save(tensorPath)
+
+    return ClientData(clientFolder, baseline, massScans, metabolites, comparisons)
+
+
+def initRenderProcess():
+    # reportlab is only imported by processes that draw PDFs
+    from render_pdf import initRenderWorker
+    initRenderWorker()
+
+
+def renderClient(clientData, outputPath, clientReport=True):
+    outputPath = Path(outputPath)
+    clientFolder = clientData.clientFolder
+    outputPdf = None
+
+    # CSVs are a side artifact, written while the report renders from memory
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        csvWrite = None
+        if WRITE_CSV:
+            csvWrite = writer.submit(
+                writeClientCsvs, clientFolder, outputPath, clientData.baseline, clientData.massScans, clientData.metabolites
+            )
+
+        if clientReport:
+            from render_pdf import renderClientReport
+
+            (_, *pageData) = clientPage(clientData)
+            outputPdf = renderClientReport(clientFolder, outputPath / (clientFolder + ".pdf"), *pageData)
+
+        if csvWrite is not None:
+            csvWrite.result()
+
+    return outputPdf
+
+
+def clientPage(clientData):
+    (_, baselineData) = clientData.baseline
+    (_, scan30Data) = clientData.massScans.get(30, (None, {}))
+
+    metabolites = labelMetabolites(clientData.metabolites)
+
+    return (
+        clientData.clientFolder,
+        baselineData,
+        scan30Data,
+        metabolites.get("baseline"),
+        metabolites.get("30min"),
+        clientData.comparisons.get(30),
+    )
+
+
+def clientResult(clientData, outputPdf):
+    (_, baselineData) = clientData.baseline
+    (_, scan30Data) = clientData.massScans.get(30, (None, {}))
+    return ClientResult(baselineData, scan30Data, clientData.metabolites, clientData.comparisons, outputPdf)
+
+
+def processClient(clientFolder, rootDir, outputPath, clientFiles=None, clientReport=True):
+    clientData = processClientData(clientFolder, rootDir, outputPath, clientFiles)
+    return clientResult(clientData, renderClient(clientData, outputPath, clientReport))
+
+
+def cohortPages(clientDatas):
+    for clientData in clientDatas:
+        yield clientPage(clientData)
+
+
+def clientDataPath(outputPath, clientFolder):
+    return Path(outputPath) / CLIENT_DATA_FOLDER / (clientFolder + ".pickle")
+
+
+def saveClientData(outputPath, clientData):
+    path = clientDataPath(outputPath, clientData.clientFolder)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmpPath = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmpPath, 'wb') as f:
+        pickle.dump(clientData, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmpPath, path)
+
+
+def loadClientData(outputPath, clientFolder):
+    # None when the saved data is missing or unreadable, the client is then parsed again
+    path = clientDataPath(outputPath, clientFolder)
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Discarding unreadable client data {path}: {e!r}")
+        path.unlink(missing_ok=True)
+        return None
+
+
+def findParsedClients(outputPath):
+    clientDataFolder = Path(outputPath) / CLIENT_DATA_FOLDER
+    if not clientDataFolder.is_dir():
+        return []
+    return sorted(path.stem for path in clientDataFolder.glob("*.pickle"))
+
+
+def warehouseClient(warehouse, outputPath, clientData):
+    (_, baselineData) = clientData.baseline
+    massScans = {str(time) + "min": scanData for time, (_, scanData) in clientData.massScans.items()}
+    parsed = clientDataPath(outputPath, clientData.clientFolder).stat().st_mtime_ns
+
+    warehouse.storeClient(clientData.clientFolder, parsed, baselineData, massScans,
+                          labelMetabolites(clientData.metabolites, times=None))
+
+
+def warehouseIsStale(warehouse, outputPath, clientFolder):
+    # Rows are current when they were stored from the client data on disk
+    path = clientDataPath(outputPath, clientFolder)
+    return warehouse is not None and path.is_file() and warehouse.parsed(clientFolder) != path.stat().st_mtime_ns
+
+
+def parseClient(clientFolder, rootDir, outputPath, clientFiles=None):
+    clientData = processClientData(clientFolder, rootDir, outputPath, clientFiles)
+    saveClientData(outputPath, clientData)
+    return clientData
+
+
+# --------------
+# STAGES
+# --------------
+
+def isFresh(inputs, outputs):
+    # Make-style check: every output exists and is newer than every input
+    if len(outputs) == 0:
+        return True
+
+    try:
+        oldestOutput = min(os.stat(path).st_mtime_ns for path in outputs)
+    except FileNotFoundError:
+        return False
+
+    for path in inputs:
+        try:
+            if os.stat(path).st_mtime_ns > oldestOutput:
+                return False
+        except FileNotFoundError:
+            # A removed input shows up through its folder's mtime
+            continue
+
+    return True
+
+
+def parseInputs(clientFiles):
+    scanPaths = [
+        *clientFiles.baseline,
+        *[path for path, _ in clientFiles.massScans],
+        *[path for path, _ in clientFiles.metabolites],
+    ]
+    # Folders are included so a removed scan also counts as a change
+    folders = {os.path.dirname(path) for path in scanPaths}
+    # Files inside an archive change with the archive
+    return [*{physicalPath(path) for path in [*scanPaths, *folders]}, *PARSE_SOURCES]
+
+
+def parseOutputs(outputPath, clientFolder):
+    outputs = [clientDataPath(outputPath, clientFolder)]
+    if WRITE_TENSORS:
+        outputs.append(clientTensorPath(outputPath, clientFolder))
+    return outputs
+
+
+def renderInputs(outputPath, clientFolder):
+    return [clientDataPath(outputPath, clientFolder), *RENDER_SOURCES]
+
+
+def renderOutputs(outputPath, clientFolder, clientReports):
+    outputs = []
+    if clientReports:
+        outputs.append(Path(outputPath) / (clientFolder + ".pdf"))
+    if WRITE_CSV:
+        outputs.append(Path(outputPath) / (clientFolder + "-baseline.csv"))
+    return outputs
+
+
+class InlineExecutor:
+    # Runs work in this process when parallelism is disabled, easier to debug
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def runClients(clientFolders, rootDir, outputPath, workers=WORKERS, aggregator=None, catalog=None,
+               renderWorkers=RENDER_WORKERS, clientReports=CLIENT_REPORTS, stages=STAGES, force=False,
+               metrics=None, profileClient=None, warehouse=None, coordinator=None):
+    results = {}
+    errors = {}
+
+    def finished(clientFolder, result=None):
+        if result is not None:
+            results[clientFolder] = result
+        if coordinator is not None:
+            coordinator.complete(clientFolder)
+
+    def failed(clientFolder, e):
+        logging.error(f"Failed to process {clientFolder}: {e!r}")
+        errors[clientFolder] = e
+        if coordinator is not None:
+            coordinator.fail(clientFolder)
+
+    def claimed(clientFolder):
+        # Without a coordinator this node does every client
+        return coordinator is None or coordinator.claim(clientFolder)
+
+    def profilePath(clientFolder, stage):
+        if clientFolder != profileClient:
+            return None
+        return Path(outputPath) / METRICS_FOLDER / f"{clientFolder}-{stage}.prof"
+
+    def streamClientFiles():
+        # A catalog hands clients out in the order their files can be read, archives in one pass
+        # Clients are claimed one at a time, just before their work starts, so nodes interleave
+        if catalog is not None:
+            for clientFolder in clientFolders:
+                if clientFolder in catalog.errors and claimed(clientFolder):
+                    failed(clientFolder, catalog.errors[clientFolder])
+
+            listed = [clientFolder for clientFolder in clientFolders if clientFolder not in catalog.errors]
+            for clientFiles in catalog.stream(listed, lambda clientFiles: needsParse(clientFiles.client, clientFiles)):
+                if claimed(clientFiles.client):
+                    yield clientFiles
+            return
+
+        for clientFolder in clientFolders:
+            if not claimed(clientFolder):
+                continue
+            try:
+                yield scanClient(clientFolder, rootDir)
+            except Exception as e:
+                failed(clientFolder, e)
+
+    def needsParse(clientFolder, clientFiles):
+        return "parse" in stages and (force or not isFresh(parseInputs(clientFiles), parseOutputs(outputPath, clientFolder)))
+
+    def needsRender(clientFolder):
+        outputs = renderOutputs(outputPath, clientFolder, clientReports)
+        return "render" in stages and len(outputs) > 0 and (force or not isFresh(renderInputs(outputPath, clientFolder), outputs))
+
+    if workers == 1:
+        dataExecutor = InlineExecutor()
+        renderExecutor = InlineExecutor()
+        maxPending = 1
+    else:
+        dataExecutor = ProcessPoolExecutor(max_workers=workers)
+        renderExecutor = ProcessPoolExecutor(max_workers=renderWorkers, initializer=initRenderProcess if clientReports else None)
+        maxPending = 2 * (workers + renderWorkers)
+
+    # Data stages and PDF rendering run in separate pools, a client renders as soon as its data is ready
+    with dataExecutor, renderExecutor:
+        pending = {}
+
+        def submitRender(clientFolder, clientData):
+            pending[renderExecutor.submit(
+                measured, renderClient, clientFolder, profilePath(clientFolder, "render"), clientData, outputPath, clientReports
+            )] = (clientFolder, clientData)
+
+        def handle(future):
+            (clientFolder, clientData) = pending.pop(future)
+            try:
+                (result, clientMetrics) = future.result()
+                if metrics is not None:
+                    metrics.merge(clientMetrics)
+
+                if clientData is None:
+                    clientData = result
+
+                    # Fold each baseline into the cohort average as soon as it is produced
+                    if aggregator is not None:
+                        aggregator.add(clientFolder + "-baseline", clientData.baseline[1])
+
+                    # Stored from this process only, one transaction per client
+                    if warehouse is not None:
+                        warehouseClient(warehouse, outputPath, clientData)
+
+                    if needsRender(clientFolder):
+                        submitRender(clientFolder, clientData)
+                    else:
+                        finished(clientFolder, clientResult(clientData, None))
+                else:
+                    finished(clientFolder, clientResult(clientData, result))
+            except Exception as e:
+                failed(clientFolder, e)
+
+        def drain(limit):
+            while len(pending) > limit:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle(future)
+
+        for clientFiles in streamClientFiles():
+            clientFolder = clientFiles.client
+            try:
+                parse = needsParse(clientFolder, clientFiles)
+                render = not parse and needsRender(clientFolder)
+                storeWarehouse = not parse and warehouseIsStale(warehouse, outputPath, clientFolder)
+
+                clientData = None
+                if render or storeWarehouse:
+                    clientData = loadClientData(outputPath, clientFolder)
+                    # Saved data that can't be read is as stale as missing data
+                    parse = clientData is None
+
+                if parse:
+                    pending[dataExecutor.submit(
+                        measured, parseClient, clientFolder, profilePath(clientFolder, "parse"), clientFolder, rootDir, outputPath, clientFiles
+                    )] = (clientFolder, None)
+                else:
+                    if storeWarehouse:
+                        warehouseClient(warehouse, outputPath, clientData)
+
+                    if render:
+                        submitRender(clientFolder, clientData)
+                    else:
+                        logging.info(f"{clientFolder} is up to date")
+                        finished(clientFolder)
+            except Exception as e:
+                failed(clientFolder, e)
+
+            drain(maxPending - 1)
+
+        drain(0)
+
+    return results, errors
+
+
+@timed("runCohortStages")
+def runCohortStages(outputPath, aggregator, stages=STAGES, force=False, cohortReport=COHORT_REPORT, foldedClients=(),
+                    dataOnly=DATA_ONLY):
+    outputPath = Path(outputPath)
+    cohortClients = findParsedClients(outputPath)
+    clientDataPaths = [clientDataPath(outputPath, clientFolder) for clientFolder in cohortClients]
+    statePath = outputPath / BASELINE_STATE_FILE
+
+    aggregateOutputs = [
+        statePath,
+        outputPath / "averageBaseline.csv",
+        outputPath / BASELINE_MATRIX_FILE,
+        outputPath / "baselineStatistics.csv",
+        outputPath / "scanDifferences.csv",
+    ]
+
+    renderInputs = [statePath, *RENDER_SOURCES]
+    renderOutputs = []
+    if not dataOnly:
+        renderOutputs.append(outputPath / "averageBaseline.pdf")
+        if cohortReport:
+            renderInputs.extend(clientDataPaths)
+            renderOutputs.append(outputPath / "cohortReport.pdf")
+
+    # Cohort CSVs and the matrix are written on a thread while the cohort PDFs render
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        writes = []
+
+        if "aggregate" in stages and (force or not isFresh(clientDataPaths, aggregateOutputs)):
+            stateTime = statePath.stat().st_mtime_ns if statePath.is_file() else 0
+            clientDatas = {clientFolder: loadClientData(outputPath, clientFolder) for clientFolder in cohortClients}
+            # Unreadable data is left out here and parsed again by the next run
+            clientDatas = {clientFolder: clientData for clientFolder, clientData in clientDatas.items() if clientData is not None}
+
+            # Baselines parsed by earlier runs that never reached this stage
+            for clientFolder, path in zip(cohortClients, clientDataPaths):
+                if clientFolder not in clientDatas:
+                    continue
+                if clientFolder not in foldedClients and (force or path.stat().st_mtime_ns > stateTime):
+                    aggregator.add(clientFolder + "-baseline", clientDatas[clientFolder].baseline[1])
+
+            for name in list(aggregator.clients):
+                if name.removesuffix("-baseline") not in clientDatas:
+                    aggregator.remove(name)
+
+            # The state is saved first, the render stage's freshness check depends on it
+            aggregator.save()
+            writes.append(writer.submit(writeAggregatedBaseline, aggregator, outputPath))
+
+            baselineMatrix = CohortMatrix.fromClientValues(aggregator.clients)
+            writes.append(writer.submit(baselineMatrix.save, outputPath / BASELINE_MATRIX_FILE))
+            writes.append(writer.submit(writeCohortStatistics, outputPath, "baselineStatistics", baselineMatrix))
+
+            writes.append(writer.submit(writeDeltaTable, outputPath, "scanDifferences", {
+                clientFolder: clientData.comparisons for clientFolder, clientData in clientDatas.items()
+            }))
+
+        if "render" in stages and len(renderOutputs) > 0 and (force or not isFresh(renderInputs, renderOutputs)):
+            from render_pdf import renderAverageBaselineReport, renderCohortReport
+
+            (_, averageBaselineData) = aggregator.catenated()
+            renderAverageBaselineReport(outputPath / "averageBaseline.pdf", averageBaselineData)
+
+            if cohortReport:
+                clientDatas = (loadClientData(outputPath, clientFolder) for clientFolder in cohortClients)
+                renderCohortReport(outputPath / "cohortReport.pdf",
+                                   cohortPages(clientData for clientData in clientDatas if clientData is not None),
+                                   averageBaselineData)
+
+        for write in writes:
+            write.result()
+
+
+class WatchedCohort:
+    # The cohort outputs kept up to date by --watch. An arrival's results are folded into what is
+    # held here and on disk, the client data of the rest of the cohort isn't read again.
+    def __init__(self, outputPath, aggregator):
+        self.outputPath = Path(outputPath)
+        self.aggregator = aggregator
+
+        # Read once when watching starts, each arrival replaces its own entry
+        self.comparisons = {}
+        for clientFolder in findParsedClients(self.outputPath):
+            clientData = loadClientData(self.outputPath, clientFolder)
+            if clientData is not None:
+                self.comparisons[clientFolder] = clientData.comparisons
+
+    def update(self, results, stages=STAGES, cohortReport=COHORT_REPORT, dataOnly=DATA_ONLY):
+        if len(results) == 0:
+            return
+
+        if "aggregate" in stages:
+            # runClients already folded the new baselines into the aggregator
+            self.aggregator.save()
+            writeAggregatedBaseline(self.aggregator, self.outputPath)
+            self.updateMatrix(results)
+            self.updateDeltaTable(results)
+
+        if "render" in stages and not dataOnly:
+            from render_pdf import renderAverageBaselineReport, renderCohortReport
+
+            (_, averageBaselineData) = self.aggregator.catenated()
+            renderAverageBaselineReport(self.outputPath / "averageBaseline.pdf", averageBaselineData)
+
+            # The cohort report has a page per client, so it still reads them all
+            if cohortReport:
+                clientDatas = (loadClientData(self.outputPath, clientFolder) for clientFolder in findParsedClients(self.outputPath))
+                renderCohortReport(self.outputPath / "cohortReport.pdf",
+                                   cohortPages(clientData for clientData in clientDatas if clientData is not None),
+                                   averageBaselineData)
+
+    def updateMatrix(self, results):
+        matrixPath = self.outputPath / BASELINE_MATRIX_FILE
+        names = [clientFolder + "-baseline" for clientFolder in results]
+        clientValues = {name: self.aggregator.clients[name] for name in names if name in self.aggregator.clients}
+
+        # New clients or ions change the matrix's shape, it is then built again from the aggregator
+        if len(clientValues) < len(names) or not CohortMatrix.updateClients(matrixPath, clientValues):
+            CohortMatrix.fromClientValues(self.aggregator.clients).save(matrixPath)
+
+        matrix = CohortMatrix.load(matrixPath)
+        writeCohortStatistics(self.outputPath, "baselineStatistics", matrix)
+        del matrix
+
+    def updateDeltaTable(self, results):
+        arrivals = {clientFolder: result.comparisons for clientFolder, result in results.items()}
+
+        # Clients sorting after everything in the table, the usual case for new clients, are appended
+        append = ((self.outputPath / "scanDifferences.csv").is_file()
+                  and (len(self.comparisons) == 0 or min(arrivals) > max(self.comparisons)))
+
+        self.comparisons.update(arrivals)
+        writeDeltaTable(self.outputPath, "scanDifferences", arrivals if append else self.comparisons, append=append)
+
+
+def argumentParser():
+    parser = argparse.ArgumentParser(description="Turn SIFT-MS client scans into per-client and cohort reports.")
+    parser.add_argument("--root", default=ROOT, help="folder, or zip or tar archive, holding the AL-* client folders")
+    parser.add_argument("--output", help="results folder, defaults to <root>/results, or <archive>-results beside an archive")
+    parser.add_argument("--clients", nargs="+", help="only these client folders")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="only these stages")
+    parser.add_argument("--jobs", "-j", type=int, default=WORKERS, help="data stage processes, 1 runs in-process")
+    parser.add_argument("--render-jobs", type=int, default=RENDER_WORKERS, help="PDF rendering processes")
+    parser.add_argument("--force", action="store_true", help="rerun stages even when their outputs are up to date")
+    parser.add_argument("--cohort-report", action="store_true", default=COHORT_REPORT,
+                        help="also render every client into one cohortReport.pdf")
+    parser.add_argument("--data-only", action="store_true", default=DATA_ONLY,
+                        help="write CSVs and arrays only, skipping every PDF")
+    parser.add_argument("--warehouse", action="store_true", default=WAREHOUSE,
+                        help=f"also store every client's results in <output>/{WAREHOUSE_FILE}")
+    parser.add_argument("--work-dir",
+                        help="share the run with other nodes through leases and journals in this shared folder")
+    parser.add_argument("--node", help="this node's name in the work folder, defaults to <host>-<pid>")
+    parser.add_argument("--lease-seconds", type=float, default=LEASE_SECONDS,
+                        help="a lease not renewed for this long is taken over by another node")
+    parser.add_argument("--profile", metavar="CLIENT",
+                        help="write cProfile stats for this client's stages under <output>/metrics")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and process clients again as new exports arrive")
+    parser.add_argument("--poll-seconds", type=float, default=POLL_SECONDS, help="how often --watch checks the root")
+    parser.add_argument("--settle-seconds", type=float, default=SETTLE_SECONDS,
+                        help="how long a new export must stay unchanged before --watch reads it")
+    return parser
+
+
+def parseArguments(argv=None):
+    parser = argumentParser()
+    args = parser.parse_args(argv)
+
+    if args.watch and (args.work_dir or isArchive(args.root)):
+        parser.error("--watch needs a root folder on this node, not an archive or a shared run")
+
+    return args
+
+
+def clientRunOptions(args):
+    # runClients arguments that come straight from the command line
+    return {
+        "workers": args.jobs,
+        "renderWorkers": args.render_jobs,
+        "clientReports": CLIENT_REPORTS and not args.data_only,
+        "stages": args.stages,
+        "profileClient": args.profile,
+    }
+
+
+def watch(args, outputPath, watcher, aggregator, warehouse=None):
+    # Sleeps between polls, only clients with settled new exports go through the stages again
+    logging.info(f"Watching {args.root} for new exports")
+
+    cohort = WatchedCohort(outputPath, aggregator)
+    # client folder -> (failed attempts, when to try again)
+    retries = {}
+
+    while True:
+        time.sleep(args.poll_seconds)
+
+        try:
+            ready = watcher.poll()
+        except Exception as e:
+            logging.error(f"Failed to poll {args.root}: {e!r}")
+            continue
+
+        now = time.monotonic()
+        ready |= {clientFolder for clientFolder, (_, retryAt) in retries.items() if retryAt <= now}
+        if args.clients:
+            ready &= set(args.clients)
+        if len(ready) == 0:
+            continue
+
+        logging.info(f"New exports for {', '.join(sorted(ready))}")
+        metrics = RunMetrics()
+
+        # Clients are scanned one by one inside runClients, so a folder that can't be read fails alone
+        results, errors = runClients(
+            sorted(ready),
+            args.root,
+            outputPath,
+            aggregator=aggregator if "aggregate" in args.stages else None,
+            metrics=metrics,
+            warehouse=warehouse,
+            **clientRunOptions(args),
+        )
+
+        try:
+            cohort.update(results, args.stages, args.cohort_report, args.data_only)
+        except Exception as e:
+            logging.error(f"Failed to update the cohort outputs, the next run rebuilds them: {e!r}")
+            # Left older than the client data, so the next run's freshness check redoes them
+            (outputPath / BASELINE_STATE_FILE).unlink(missing_ok=True)
+
+        for clientFolder in ready:
+            if clientFolder not in errors:
+                retries.pop(clientFolder, None)
+                continue
+
+            attempts = retries.get(clientFolder, (0, 0))[0] + 1
+            if attempts > WATCH_RETRIES:
+                logging.warning(f"Giving up on {clientFolder} until its exports change")
+                retries.pop(clientFolder)
+            else:
+                retries[clientFolder] = (attempts, now + args.poll_seconds * 2 ** attempts)
+
+        if errors:
+            logging.warning(f"{len(errors)} of {len(ready)} clients failed: {', '.join(sorted(errors))}")
+
+        try:
+            metrics.write(outputPath / METRICS_FOLDER)
+        except OSError as e:
+            logging.error(f"Failed to write run metrics: {e!r}")
+
+
+def main(argv=None):
+    args = parseArguments(argv)
+
+    if args.output:
+        outputPath = Path(args.output)
+    elif isArchive(args.root):
+        outputPath = Path(args.root).with_name(f"{archiveStem(args.root)}-results")
+    else:
+        outputPath = Path(args.root) / "results"
+    outputPath.mkdir(parents=True, exist_ok=True)
+
+    metrics = RunMetrics()
+
+    # Snapshot taken before the first run, so exports arriving during it are picked up after
+    watcher = FolderWatch(args.root, args.settle_seconds) if args.watch else None
+
+    # discover
+    if isArchive(args.root):
+        catalog = ArchiveCatalog.build(args.root, args.clients)
+        knownFolders = catalog.clients()
+    else:
+        knownFolders = findClientFolders(args.root)
+
+    # A mistyped name would otherwise fail deep in the run, or not at all from an archive
+    unknownFolders = sorted(set(args.clients or []) - set(knownFolders))
+    if unknownFolders:
+        argumentParser().error(f"no client folder {', '.join(unknownFolders)} in {args.root}")
+
+    clientFolders = sorted(set(args.clients)) if args.clients else knownFolders
+
+    aggregator = BaselineAggregator(outputPath / BASELINE_STATE_FILE)
+    # Nodes sharing a run share its results folder, and with it the warehouse
+    warehouse = ResultsWarehouse(outputPath / WAREHOUSE_FILE, shared=bool(args.work_dir)) if args.warehouse else None
+
+    # A shared run skips what any node has journaled and claims the rest client by client
+    coordinator = None
+    remainingFolders = clientFolders
+    if args.work_dir:
+        coordinator = BatchCoordinator(args.work_dir, args.node, args.lease_seconds)
+        remainingFolders = coordinator.pending(clientFolders)
+        logging.info(f"{coordinator.node}: {len(clientFolders) - len(remainingFolders)} of {len(clientFolders)} clients "
+                     f"are already journaled as done")
+
+    # Only folders still to do are listed, journaled clients cost this node nothing
+    if not isArchive(args.root):
+        catalog = InputCatalog.build(args.root, remainingFolders)
+
+    # parse and render per client
+    results, errors = runClients(
+        remainingFolders,
+        args.root,
+        outputPath,
+        aggregator=aggregator if "aggregate" in args.stages else None,
+        catalog=catalog,
+        metrics=metrics,
+        warehouse=warehouse,
+        coordinator=coordinator,
+        force=args.force,
+        **clientRunOptions(args),
+    )
+
+    # Closes the archive before the cohort stages
+    if isinstance(catalog, ArchiveCatalog):
+        catalog.close()
+
+    if warehouse is not None:
+        warehouse.retain(findParsedClients(outputPath))
+
+    if errors:
+        logging.warning(f"{len(errors)} of {len(clientFolders)} clients failed: {', '.join(sorted(errors))}")
+
+    quarantined = quarantinedFiles(outputPath / QUARANTINE_FOLDER)
+    if quarantined:
+        logging.warning(f"{len(quarantined)} exports are quarantined, see {outputPath / QUARANTINE_FOLDER}")
+
+    # aggregate and render the cohort, in a shared run only once every client is done or has failed
+    runCohort = coordinator is None or coordinator.claimCohort(clientFolders)
+    if runCohort:
+        # Failed clients on every node, the cohort is built without their new data
+        failedClients = sorted(errors) if coordinator is None else coordinator.failedClients(clientFolders)
+        if failedClients:
+            logging.warning(f"The cohort goes ahead without {len(failedClients)} failed clients: {', '.join(failedClients)}")
+        quarantinedFolders = quarantinedClients(outputPath / QUARANTINE_FOLDER)
+        if quarantinedFolders:
+            logging.warning(f"The cohort includes {len(quarantinedFolders)} clients with quarantined exports: "
+                            f"{', '.join(quarantinedFolders)}")
+
+        runCohortStages(outputPath, aggregator, args.stages, args.force, args.cohort_report, foldedClients=results,
+                        dataOnly=args.data_only)
+    elif COHORT in coordinator.done:
+        logging.info("The cohort stages are already journaled as done")
+    else:
+        logging.info("Leaving the cohort stages to the node that finishes the last client")
+
+    if coordinator is not None:
+        if runCohort:
+            coordinator.complete(COHORT, failed=failedClients, quarantined=quarantinedFolders)
+        coordinator.close()
+
+    node = coordinator.node if coordinator is not None else None
+    logging.info(f"Run metrics written to {metrics.write(outputPath / METRICS_FOLDER, node)}")
+
+    if watcher is not None:
+        try:
+            watch(args, outputPath, watcher, aggregator, warehouse)
+        except KeyboardInterrupt:
+            logging.info("Stopped watching")
+
+    if warehouse is not None:
+        warehouse.close()
+
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import os
+import tarfile
+import zipfile
+from collections import defaultdict
+from pathlib import PurePosixPath
+
+from input_catalog import CLIENT_FOLDER_PATTERN, classifyFiles
+from run_metrics import addMetric, timed
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz')
+
+
+def isArchive(path):
+    return str(path).lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path)
+
+
+def archiveStem(path):
+    name = os.path.basename(str(path))
+    for suffix in sorted(ARCHIVE_SUFFIXES, key=len, reverse=True):
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def memberPath(archivePath, memberName):
+    # Members are addressed as if the archive were a folder
+    return os.path.join(str(archivePath), *PurePosixPath(memberName).parts)
+
+
+def physicalPath(path):
+    # The archive holding a member path, or the path itself
+    current = str(path)
+    while True:
+        if isArchive(current):
+            return current
+
+        parent = os.path.dirname(current)
+        if parent in ('', current):
+            return str(path)
+        current = parent
+
+
+def clientMember(memberName):
+    # (client folder, sub folder, file name) for files exactly two levels below an AL-* folder
+    parts = PurePosixPath(memberName).parts
+    for i, part in enumerate(parts):
+        if CLIENT_FOLDER_PATTERN.match(part):
+            if len(parts) - i == 3:
+                return (part, parts[i + 1], parts[i + 2])
+            return None
+    return None
+
+
+def isCompressedTar(archivePath):
+    return str(archivePath).lower().endswith(('.tar.gz', '.tgz'))
+
+
+def openArchive(archivePath):
+    # (archive, {member name: info}) for the files in a zip or tar, read from the archive's own index.
+    # A compressed tar has none and can't be read at an offset, it is listed in one streamed pass
+    # and left closed, stream reads it again front to back
+    if str(archivePath).lower().endswith('.zip'):
+        archive = zipfile.ZipFile(archivePath)
+        return (archive, {info.filename: info for info in archive.infolist() if not info.is_dir()})
+
+    if isCompressedTar(archivePath):
+        with tarfile.open(archivePath, 'r|*') as archive:
+            return (None, {member.name: member for member in archive if member.isfile()})
+
+    archive = tarfile.open(archivePath, 'r:')
+    return (archive, {member.name: member for member in archive.getmembers() if member.isfile()})
+
+
+def memberOffset(info):
+    return info.header_offset if isinstance(info, zipfile.ZipInfo) else info.offset_data
+
+
+@timed("readArchiveMember")
+def readMember(archive, info):
+    if isinstance(archive, zipfile.ZipFile):
+        data = archive.read(info)
+    else:
+        data = archive.extractfile(info).read()
+    addMetric("bytesRead", len(data))
+    return data
+
+
+class ArchiveCatalog:
+    # An InputCatalog over the client folders inside a zip or tar archive
+    def __init__(self, rootDir, clients, archive=None, members=None):
+        self.rootDir = rootDir
+        self.clientFiles = {clientFiles.client: clientFiles for clientFiles in clients}
+        # Kept open from build, stream reads members by the offsets listed then. None for a compressed tar
+        self.archive = archive
+        self.members = members or {}
+        # Members are listed from the archive's index in one go, no client fails on its own here
+        self.errors = {}
+
+    @classmethod
+    @timed("scanArchive")
+    def build(cls, rootDir, clientFolders=None):
+        listing = defaultdict(list)
+        (archive, infos) = openArchive(rootDir)
+
+        members = {}
+        for memberName, info in infos.items():
+            found = clientMember(memberName)
+            if found is None:
+                continue
+
+            (clientFolder, subDirName, fileName) = found
+            if clientFolders is None or clientFolder in clientFolders:
+                path = memberPath(rootDir, memberName)
+                listing[clientFolder].append((subDirName, fileName, path))
+                members[path] = info
+
+        clients = [classifyFiles(clientFolder, listing[clientFolder]) for clientFolder in sorted(listing)]
+        return cls(rootDir, clients, archive, members)
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+    def clients(self):
+        return list(self.clientFiles)
+
+    def client(self, clientFolder):
+        return self.clientFiles[clientFolder]
+
+    def stream(self, clientFolders, needsData=None):
+        # Clients in the order their files sit in the archive, each read on its own and handed out
+        # at once, so only the client being read is held here
+        wanted = {}
+        for clientFolder in clientFolders:
+            clientFiles = self.client(clientFolder)
+            if needsData is not None and not needsData(clientFiles):
+                yield clientFiles
+                continue
+
+            paths = {*clientFiles.baseline, *[path for path, _ in clientFiles.massScans],
+                     *[path for path, _ in clientFiles.metabolites]}
+            wanted[clientFolder] = sorted(paths, key=lambda path: memberOffset(self.members[path]))
+
+        if self.archive is None:
+            yield from self.streamCompressed(wanted)
+            return
+
+        def firstOffset(clientFolder):
+            paths = wanted[clientFolder]
+            return memberOffset(self.members[paths[0]]) if len(paths) > 0 else -1
+
+        for clientFolder in sorted(wanted, key=firstOffset):
+            members = {path: readMember(self.archive, self.members[path]) for path in wanted[clientFolder]}
+            yield self.client(clientFolder)._replace(members=members)
+
+    def streamCompressed(self, wanted):
+        # One pass over the archive, a client is handed out as soon as its last member has been read,
+        # so only clients with members still to come are held here
+        owners = {path: clientFolder for clientFolder, paths in wanted.items() for path in paths}
+        members = {clientFolder: {} for clientFolder in wanted}
+
+        for clientFolder in [clientFolder for clientFolder, paths in wanted.items() if len(paths) == 0]:
+            yield self.client(clientFolder)._replace(members=members.pop(clientFolder))
+
+        if len(owners) > 0:
+            with tarfile.open(self.rootDir, 'r|*') as archive:
+                for member in archive:
+                    path = memberPath(self.rootDir, member.name)
+                    clientFolder = owners.get(path)
+                    if clientFolder is None or clientFolder not in members:
+                        continue
+
+                    members[clientFolder][path] = readMember(archive, member)
+                    if len(members[clientFolder]) == len(wanted[clientFolder]):
+                        yield self.client(clientFolder)._replace(members=members.pop(clientFolder))
+
+        # Members gone from the archive since build, the parse reports what is missing
+        for clientFolder in list(members):
+            yield self.client(clientFolder)._replace(members=members.pop(clientFolder))
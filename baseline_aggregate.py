@@ -0,0 +1,78 @@
+import json
+import os
+from pathlib import Path
+
+
+class BaselineAggregator:
+    def __init__(self, statePath):
+        self.statePath = Path(statePath)
+        self.clients = {}
+        self.sums = {}
+        self.counts = {}
+
+        if self.statePath.is_file():
+            self.load()
+
+    def add(self, name, baselineData):
+        self.remove(name)
+
+        values = {key: valueList[0] for key, valueList in baselineData.items()}
+
+        # Clients without a complete baseline scan don't contribute
+        if len(values) == 0:
+            return
+
+        self.clients[name] = values
+        for key, value in values.items():
+            self.sums[key] = self.sums.get(key, 0.0) + value
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def remove(self, name):
+        values = self.clients.pop(name, None)
+
+        if values is None:
+            return
+
+        for key, value in values.items():
+            self.counts[key] -= 1
+            if self.counts[key] == 0:
+                del self.counts[key]
+                del self.sums[key]
+            else:
+                self.sums[key] -= value
+
+    def average(self):
+        return {key: self.sums[key] / self.counts[key] for key in self.sums}
+
+    def catenated(self):
+        names = sorted(self.clients)
+        average = self.average()
+
+        newData = {}
+        for key in sorted(average):
+            newData[key] = [average[key], *[self.clients[name].get(key, '') for name in names]]
+
+        return (["Average Intensity", *names], newData)
+
+    def load(self):
+        with open(self.statePath, 'r') as f:
+            state = json.load(f)
+
+        for name, values in state["clients"].items():
+            self.add(name, {
+                (reagent, product): [value] for reagent, product, value in values
+            })
+
+    def save(self):
+        state = {
+            "clients": {
+                name: [[reagent, product, value] for (reagent, product), value in values.items()]
+                for name, values in self.clients.items()
+            }
+        }
+
+        # Write next to the real file so a crash never leaves a truncated state
+        tmpPath = self.statePath.with_suffix('.tmp')
+        with open(tmpPath, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmpPath, self.statePath)
@@ -0,0 +1,240 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+
+# A lease not renewed for this long belongs to a node that died, others may take it over
+LEASE_SECONDS = 15 * 60
+
+LEASE_FOLDER = "leases"
+JOURNAL_PATTERN = "journal-*.jsonl"
+
+# Lease and journal name for the cohort stages, run once by the node that finds every client settled
+COHORT = "cohort"
+
+
+def defaultNode():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class BatchCoordinator:
+    # Shares a run's client folders between nodes through a work folder on the shared filesystem.
+    # A node claims a client by creating its lease file, keeps it fresh by touching it,
+    # and appends the client to its own journal once done. Journals are only ever appended
+    # to by the node that owns them, so no two nodes write the same file.
+    def __init__(self, workDir, node=None, leaseSeconds=LEASE_SECONDS):
+        self.workDir = Path(workDir)
+        self.node = node or defaultNode()
+        self.leaseSeconds = leaseSeconds
+
+        self.leaseDir = self.workDir / LEASE_FOLDER
+        self.leaseDir.mkdir(parents=True, exist_ok=True)
+        self.journalPath = self.workDir / f"journal-{self.node}.jsonl"
+
+        self.done = set()
+        # Failed on their last attempt, done wins over failed whichever journal says so first
+        self.failed = set()
+        self.journalOffsets = {}
+        self.held = set()
+        self.lock = threading.Lock()
+
+        self.stopped = threading.Event()
+        self.heartbeat = threading.Thread(target=self.renewLeases, daemon=True)
+        self.heartbeat.start()
+
+    def close(self):
+        self.stopped.set()
+        self.heartbeat.join()
+
+        for name in list(self.held):
+            self.release(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def refresh(self):
+        # Reads whatever every node has appended since the last refresh
+        for journalPath in sorted(self.workDir.glob(JOURNAL_PATTERN)):
+            offset = self.journalOffsets.get(journalPath, 0)
+            with open(journalPath, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+
+            # A line still being written has no newline yet, it is read next time
+            complete = data[:data.rfind(b'\n') + 1]
+            self.journalOffsets[journalPath] = offset + len(complete)
+
+            for line in complete.splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logging.warning(f"Ignoring a damaged line in {journalPath}")
+                    continue
+
+                self.record(entry["name"], entry.get("status"))
+
+        return self.done
+
+    def pending(self, names):
+        done = self.refresh()
+        return [name for name in names if name not in done]
+
+    def record(self, name, status):
+        if status == "done":
+            self.done.add(name)
+            self.failed.discard(name)
+        elif status == "failed" and name not in self.done:
+            self.failed.add(name)
+
+    def journal(self, name, status, **details):
+        entry = {"name": name, "status": status, "node": self.node, "time": time.time(), **details}
+        with open(self.journalPath, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.record(name, status)
+
+    def leasePath(self, name):
+        return self.leaseDir / f"{name}.lease"
+
+    def isExpired(self, path):
+        try:
+            return time.time() - path.stat().st_mtime > self.leaseSeconds
+        except FileNotFoundError:
+            return True
+
+    def createLease(self, path):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"node": self.node, "host": socket.gethostname(), "pid": os.getpid(), "acquired": time.time()}, f)
+        return True
+
+    def isAbandoned(self, path):
+        if self.isExpired(path):
+            return True
+
+        # A process on this host that is gone won't renew its leases, no need to wait them out
+        lease = self.readLease(path)
+        if lease is None or lease.get("host") != socket.gethostname() or lease.get("pid") == os.getpid():
+            return False
+        try:
+            os.kill(lease["pid"], 0)
+        except ProcessLookupError:
+            return True
+        except (OSError, KeyError, TypeError):
+            return False
+        return False
+
+    def breakLease(self, path):
+        # Only one node may remove an expired lease, the others back off
+        breakPath = path.with_suffix(".break")
+        if not self.createLease(breakPath):
+            # A node that died while breaking the lease leaves this behind
+            if self.isExpired(breakPath):
+                breakPath.unlink(missing_ok=True)
+            return False
+
+        try:
+            if not self.isAbandoned(path):
+                return False
+
+            logging.warning(f"Taking over the abandoned lease {path.name} from {self.leaseOwner(path)}")
+            path.unlink(missing_ok=True)
+            return self.createLease(path)
+        finally:
+            breakPath.unlink(missing_ok=True)
+
+    def readLease(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def leaseOwner(self, path):
+        lease = self.readLease(path)
+        return None if lease is None else lease.get("node")
+
+    def claim(self, name):
+        # True when this node now holds the lease and nobody has journaled the work as done
+        if name in self.done:
+            return False
+
+        path = self.leasePath(name)
+        if not self.createLease(path) and not (self.isAbandoned(path) and self.breakLease(path)):
+            return False
+
+        with self.lock:
+            self.held.add(name)
+
+        # Done by another node between our last refresh and taking the lease
+        if name in self.refresh():
+            self.release(name)
+            return False
+
+        return True
+
+    def release(self, name):
+        with self.lock:
+            self.held.discard(name)
+
+        path = self.leasePath(name)
+        if self.leaseOwner(path) == self.node:
+            path.unlink(missing_ok=True)
+
+    def complete(self, name, **details):
+        # Journaled before the lease goes, so the work is never both unleased and unrecorded
+        self.journal(name, "done", **details)
+        self.release(name)
+
+    def fail(self, name):
+        # Left for a later run, or another node, to retry
+        self.journal(name, "failed")
+        self.release(name)
+
+    def renewLeases(self):
+        while not self.stopped.wait(self.leaseSeconds / 3):
+            with self.lock:
+                held = list(self.held)
+
+            for name in held:
+                path = self.leasePath(name)
+                if self.leaseOwner(path) != self.node:
+                    logging.warning(f"Lost the lease on {name}, another node may be redoing it")
+                    with self.lock:
+                        self.held.discard(name)
+                    continue
+
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    pass
+
+    def isLeased(self, name):
+        path = self.leasePath(name)
+        return path.exists() and not self.isAbandoned(path)
+
+    def failedClients(self, names):
+        self.refresh()
+        return [name for name in names if name in self.failed]
+
+    def claimCohort(self, names):
+        # The node that finds every client settled runs the cohort stages. A failed client is settled
+        # unless another node is retrying it, the cohort goes ahead without it and a later run retries it
+        self.refresh()
+        for name in names:
+            if name not in self.done and (name not in self.failed or self.isLeased(name)):
+                return False
+        return self.claim(COHORT)
@@ -0,0 +1,173 @@
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from al_syft import (findBaselineFilenames, findMassScansFileNames, findMetabolitesFileNames, process_file,
+                     process_metabolite_file, catenateFilesWithAverage, computeConsolodatedBaselines, processBaseline,
+                     processMassScans, processMetabolites)
+from input_catalog import InputCatalog
+from synthetic_exports import generateCohort
+
+COHORT_SIZES = [10, 100, 1000]
+
+# Saved results, compared against the previous run
+RESULTS_FOLDER = Path(__file__).parent / "benchmarks"
+
+
+def timeCalls(fn, argsList):
+    start = time.perf_counter()
+    for args in argsList:
+        fn(*args)
+    seconds = time.perf_counter() - start
+
+    return {
+        "calls": len(argsList),
+        "seconds": seconds,
+        "perCall": seconds / len(argsList) if argsList else 0.0,
+    }
+
+
+def benchmarkCohort(rootDir, outputPath, renderLimit=None):
+    outputPath = Path(outputPath)
+    outputPath.mkdir(parents=True, exist_ok=True)
+
+    catalog = InputCatalog.build(rootDir)
+    clientFolders = catalog.clients()
+    scanFiles = [
+        path for client in clientFolders
+        for path in [*catalog.client(client).baseline, *[path for path, _ in catalog.client(client).massScans]]
+    ]
+    metaboliteFiles = [path for client in clientFolders for path, _ in catalog.client(client).metabolites]
+
+    results = {}
+
+    # Finders walk the client folders themselves, as they did before the catalog
+    results["findBaselineFilenames"] = timeCalls(findBaselineFilenames, [(client, rootDir) for client in clientFolders])
+    results["findMassScansFileNames"] = timeCalls(findMassScansFileNames, [(client, rootDir) for client in clientFolders])
+    results["findMetabolitesFileNames"] = timeCalls(findMetabolitesFileNames, [(client, rootDir) for client in clientFolders])
+
+    results["process_file"] = timeCalls(process_file, [(path,) for path in scanFiles])
+    results["process_metabolite_file"] = timeCalls(process_metabolite_file, [(path,) for path in metaboliteFiles])
+
+    baselines = []
+    for client in clientFolders:
+        paths = catalog.client(client).baseline
+        datas = [process_file(path) for path in paths]
+        baselines.append(([Path(path).name for path, data in zip(paths, datas) if data is not None],
+                          [data for data in datas if data is not None]))
+    results["catenateFilesWithAverage"] = timeCalls(catenateFilesWithAverage, baselines)
+
+    # The CSVs the consolidation and the CSV-based renderer read
+    for client in clientFolders:
+        clientFiles = catalog.client(client)
+        processBaseline(client, rootDir, outputPath, clientFiles=clientFiles)
+        processMassScans(client, rootDir, outputPath, clientFiles=clientFiles)
+        processMetabolites(client, rootDir, outputPath, clientFiles=clientFiles)
+
+    results["computeConsolodatedBaselines"] = timeCalls(computeConsolodatedBaselines, [(outputPath,)])
+
+    renderClients = clientFolders if renderLimit is None else clientFolders[:renderLimit]
+    if len(renderClients) > 0:
+        from render_pdf import renderClientPDF
+
+        results["renderClientPDF"] = timeCalls(renderClientPDF, [(
+            outputPath / f"{client}-baseline.csv",
+            outputPath / f"{client}-30min.csv",
+            outputPath / f"{client}-metabolite-baseline.csv",
+            outputPath / f"{client}-metabolite-30min.csv",
+        ) for client in renderClients])
+
+    return results
+
+
+def cohortTree(treesDir, clients, seed, incompleteRate):
+    rootDir = Path(treesDir) / f"{clients}-clients-seed{seed}-incomplete{incompleteRate}"
+    if not rootDir.is_dir():
+        logging.warning(f"Generating {clients} synthetic clients in {rootDir}")
+        generateCohort(rootDir, clients, seed, incompleteRate)
+    return rootDir
+
+
+def gitCommit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previousResults(resultsFolder):
+    paths = sorted(Path(resultsFolder).glob("bench-*.json"))
+    if len(paths) == 0:
+        return None
+
+    with open(paths[-1]) as f:
+        return json.load(f)
+
+
+def printResults(results, previous):
+    print(f"{'clients':>8} {'target':<30} {'calls':>7} {'seconds':>10} {'per call':>12} {'change':>8}")
+    for clients, targets in results.items():
+        for target, result in targets.items():
+            change = ""
+            before = (previous or {}).get("cohorts", {}).get(clients, {}).get(target)
+            if before is not None and before["perCall"] > 0:
+                change = f"{(result['perCall'] / before['perCall'] - 1) * 100:+.1f}%"
+
+            print(f"{clients:>8} {target:<30} {result['calls']:>7} {result['seconds']:>10.3f} "
+                  f"{result['perCall'] * 1000:>10.3f}ms {change:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the pipeline's stages on synthetic cohorts.")
+    parser.add_argument("--clients", type=int, nargs="+", default=COHORT_SIZES, help="cohort sizes to run")
+    parser.add_argument("--trees", help="keep generated cohorts here and reuse them, defaults to a temporary folder")
+    parser.add_argument("--incomplete", type=float, default=0.02, help="fraction of exports left incomplete")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--render-limit", type=int, help="only render this many clients per cohort")
+    parser.add_argument("--results", default=RESULTS_FOLDER, help="folder the results are saved in")
+    args = parser.parse_args(argv)
+
+    # Per-file logging would be most of what gets timed
+    logging.getLogger().setLevel(logging.WARNING)
+
+    started = datetime.now()
+    previous = previousResults(args.results)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        treesDir = Path(args.trees) if args.trees else Path(tmp) / "trees"
+
+        for clients in args.clients:
+            rootDir = cohortTree(treesDir, clients, args.seed, args.incomplete)
+            results[str(clients)] = benchmarkCohort(rootDir, Path(tmp) / f"results-{clients}", args.render_limit)
+
+    printResults(results, previous)
+
+    resultsFolder = Path(args.results)
+    resultsFolder.mkdir(parents=True, exist_ok=True)
+    resultsFile = resultsFolder / f"bench-{started:%Y%m%d-%H%M%S}.json"
+    with open(resultsFile, 'w') as f:
+        json.dump({
+            "started": started.isoformat(timespec="seconds"),
+            "commit": gitCommit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "incomplete": args.incomplete,
+            "cohorts": results,
+        }, f, indent=2)
+
+    print(f"Saved {resultsFile}")
+
+
+if __name__ == "__main__":
+    main()
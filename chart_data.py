@@ -0,0 +1,66 @@
+import numpy as np
+
+from scan_compare import scanToArrays
+
+# Products above this are cut from the charts
+CHART_MAX_PRODUCT = 150
+
+# Most points drawn per reagent line, reduced with LTTB, 0 draws every point
+CHART_POINT_BUDGET = 0
+
+
+def lttbIndices(x, y, budget):
+    # Largest-triangle-three-buckets: keeps the first and last points and,
+    # from each bucket between them, the point making the largest triangle with its neighbours
+    n = len(x)
+    if budget == 0 or budget >= n or budget < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    selected = np.empty(budget, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for bucket in range(budget - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        nextEnd = edges[bucket + 2] if bucket + 2 < len(edges) else n
+
+        nextX = x[end:nextEnd].mean()
+        nextY = y[end:nextEnd].mean()
+
+        areas = np.abs(
+            (x[previous] - nextX) * (y[start:end] - y[previous]) - (x[previous] - x[start:end]) * (nextY - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def chartSeries(reagents, products, intensities, maxProduct=CHART_MAX_PRODUCT, pointBudget=None):
+    # {reagent: [(product, intensity)]}, reagents in the order they first appear
+    if pointBudget is None:
+        pointBudget = CHART_POINT_BUDGET
+
+    reagents = np.asarray(reagents)
+    products = np.asarray(products)
+    intensities = np.asarray(intensities, dtype=float)
+
+    (uniqueReagents, firstRows) = np.unique(reagents, return_index=True)
+    kept = products <= maxProduct
+
+    series = {}
+    for reagent in uniqueReagents[np.argsort(firstRows)].tolist():
+        rows = np.flatnonzero((reagents == reagent) & kept)
+        rows = rows[lttbIndices(products[rows], intensities[rows], pointBudget)]
+        series[reagent] = list(zip(products[rows].tolist(), intensities[rows].tolist()))
+
+    return series
+
+
+def scanSeries(scanData, maxProduct=CHART_MAX_PRODUCT, pointBudget=None):
+    return chartSeries(*scanToArrays(scanData), maxProduct, pointBudget)
@@ -0,0 +1,4 @@
+from collections import namedtuple
+
+# Kept out of al_syft, which also runs as __main__, so saved client data names a module every run can import
+ClientData = namedtuple('ClientData', ['clientFolder', 'baseline', 'massScans', 'metabolites', 'comparisons'])
@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import numpy as np
+
+from scan_compare import ionKeys
+from scan_parser import METABOLITE_ANALYTES
+
+
+class ClientTensor:
+    def __init__(self, arrays):
+        # Either a dict of arrays or an open NpzFile, whose arrays are only read on first access
+        self.arrays = arrays
+
+    @classmethod
+    def fromScans(cls, baselineData, massScans, metabolites):
+        # massScans maps minutes -> {(reagent, product): [intensity, ...]}
+        # metabolites maps minutes -> {analyte: concentration}
+        times = sorted(massScans)
+        keys = sorted(set(baselineData).union(*[massScans[time].keys() for time in times]))
+        columns = {key: i for i, key in enumerate(keys)}
+
+        intensities = np.full((len(times), len(keys)), np.nan)
+        for row, time in enumerate(times):
+            intensities[row] = denseRow(massScans[time], columns)
+
+        metaboliteTimes = sorted(metabolites)
+        concentrations = np.array(
+            [[metabolites[time][analyte] for analyte in METABOLITE_ANALYTES] for time in metaboliteTimes],
+            dtype=float,
+        ).reshape(len(metaboliteTimes), len(METABOLITE_ANALYTES))
+
+        return cls({
+            'times': np.array(times, dtype=np.int64),
+            'reagents': np.array([reagent for reagent, _ in keys], dtype=np.int64),
+            'products': np.array([product for _, product in keys], dtype=np.int64),
+            'baseline': denseRow(baselineData, columns),
+            'intensities': intensities,
+            'metaboliteTimes': np.array(metaboliteTimes, dtype=np.int64),
+            'analytes': np.array(METABOLITE_ANALYTES, dtype=str),
+            'concentrations': concentrations,
+        })
+
+    @classmethod
+    def load(cls, path):
+        return cls(np.load(path))
+
+    def save(self, path):
+        np.savez(path, **{name: self.arrays[name] for name in self.arrays})
+
+    def close(self):
+        if hasattr(self.arrays, 'close'):
+            self.arrays.close()
+
+    def __getattr__(self, name):
+        try:
+            value = self.__dict__['arrays'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+        self.__dict__[name] = value
+        return value
+
+    def timeIndex(self, minutes):
+        matches = np.flatnonzero(self.times == minutes)
+        if len(matches) == 0:
+            raise KeyError(minutes)
+        return matches[0]
+
+    def ionIndex(self, reagent, product):
+        matches = np.flatnonzero(ionKeys(self.reagents, self.products) == ionKeys([reagent], [product])[0])
+        if len(matches) == 0:
+            raise KeyError((reagent, product))
+        return matches[0]
+
+    def timepoint(self, minutes):
+        return self.intensities[self.timeIndex(minutes)]
+
+    def timepointData(self, minutes):
+        intensities = self.timepoint(minutes)
+        present = ~np.isnan(intensities)
+        return {
+            (reagent, product): [intensity] for reagent, product, intensity in zip(
+                self.reagents[present].tolist(), self.products[present].tolist(), intensities[present].tolist()
+            )
+        }
+
+    def trajectory(self, reagent, product):
+        return (self.times, self.intensities[:, self.ionIndex(reagent, product)])
+
+    def metaboliteTrajectory(self, analyte):
+        column = self.analytes.tolist().index(analyte)
+        return (self.metaboliteTimes, self.concentrations[:, column])
+
+
+def denseRow(scanData, columns):
+    row = np.full(len(columns), np.nan)
+    index = np.fromiter((columns[key] for key in scanData), dtype=np.int64, count=len(scanData))
+    row[index] = np.fromiter((values[0] for values in scanData.values()), dtype=float, count=len(scanData))
+    return row
+
+
+def clientTensorPath(outputPath, clientFolder):
+    return Path(outputPath) / "tensors" / (clientFolder + ".npz")
@@ -0,0 +1,143 @@
+import csv
+from pathlib import Path
+
+import numpy as np
+
+from scan_compare import ionKeys
+
+STATISTIC_PERCENTILES = (5, 25, 75, 95)
+
+
+class CohortMatrix:
+    def __init__(self, clients, reagents, products, values):
+        self.clients = list(clients)
+        self.reagents = np.asarray(reagents, dtype=np.int64)
+        self.products = np.asarray(products, dtype=np.int64)
+        # clients x ions, NaN where a client has no value for an ion
+        self.values = values
+
+    @classmethod
+    def fromClientValues(cls, clientValues):
+        # clientValues maps client -> {(reagent, product): intensity}
+        clients = sorted(clientValues)
+
+        keys = sorted(set().union(*[clientValues[client].keys() for client in clients]))
+        columns = {key: i for i, key in enumerate(keys)}
+
+        values = np.full((len(clients), len(keys)), np.nan)
+        for row, client in enumerate(clients):
+            ions = clientValues[client]
+            index = np.fromiter((columns[key] for key in ions), dtype=np.int64, count=len(ions))
+            values[row, index] = np.fromiter(ions.values(), dtype=float, count=len(ions))
+
+        reagents = [reagent for reagent, _ in keys]
+        products = [product for _, product in keys]
+        return cls(clients, reagents, products, values)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        path = Path(path)
+
+        with np.load(indexPath(path)) as index:
+            clients = index['clients'].tolist()
+            reagents = index['reagents']
+            products = index['products']
+
+        values = np.load(path.with_suffix('.npy'), mmap_mode='r' if mmap else None)
+        return cls(clients, reagents, products, values)
+
+    def save(self, path):
+        path = Path(path)
+        np.save(path.with_suffix('.npy'), np.asarray(self.values))
+        np.savez(indexPath(path), clients=np.array(self.clients, dtype=str), reagents=self.reagents, products=self.products)
+
+    @classmethod
+    def updateClients(cls, path, clientValues):
+        # Rewrites the rows of clients in the saved matrix in place. Only when each client keeps
+        # the same ions, otherwise the columns change and False is returned with nothing written
+        path = Path(path)
+        if not path.with_suffix('.npy').is_file() or not indexPath(path).is_file():
+            return False
+
+        matrix = cls.load(path)
+        columns = {key: i for i, key in enumerate(zip(matrix.reagents.tolist(), matrix.products.tolist()))}
+
+        rows = {}
+        for client, ions in clientValues.items():
+            if client not in matrix.clients or not ions.keys() <= columns.keys():
+                return False
+
+            row = matrix.clients.index(client)
+            index = np.fromiter((columns[key] for key in ions), dtype=np.int64, count=len(ions))
+            if not np.array_equal(np.sort(index), np.flatnonzero(~np.isnan(matrix.values[row]))):
+                return False
+
+            rows[row] = (index, np.fromiter(ions.values(), dtype=float, count=len(ions)))
+        del matrix
+
+        values = np.load(path.with_suffix('.npy'), mmap_mode='r+')
+        for row, (index, intensities) in rows.items():
+            values[row, index] = intensities
+        values.flush()
+        del values
+        return True
+
+    def columnIndex(self, reagent, product):
+        matches = np.flatnonzero(ionKeys(self.reagents, self.products) == ionKeys([reagent], [product])[0])
+        if len(matches) == 0:
+            raise KeyError((reagent, product))
+        return matches[0]
+
+    def column(self, reagent, product):
+        return self.values[:, self.columnIndex(reagent, product)]
+
+    def client(self, client):
+        return self.values[self.clients.index(client)]
+
+    def missing(self):
+        return np.isnan(self.values)
+
+    def coverage(self):
+        # Fraction of clients with a value for each ion
+        if len(self.clients) == 0:
+            return np.zeros(len(self.reagents))
+        return 1 - self.missing().mean(axis=0)
+
+    def mean(self):
+        return np.nanmean(self.values, axis=0)
+
+    def median(self):
+        return np.nanmedian(self.values, axis=0)
+
+    def std(self):
+        return np.nanstd(self.values, axis=0)
+
+    def percentile(self, q):
+        return np.nanpercentile(self.values, q, axis=0)
+
+    def statistics(self):
+        statistics = {
+            "Mean": self.mean(),
+            "Median": self.median(),
+            "Std": self.std(),
+        }
+
+        for q, values in zip(STATISTIC_PERCENTILES, self.percentile(STATISTIC_PERCENTILES)):
+            statistics[f"P{q}"] = values
+
+        statistics["Coverage"] = self.coverage()
+        return statistics
+
+
+def indexPath(path):
+    return path.with_name(path.stem + '-index.npz')
+
+
+def writeCohortStatistics(outputPath, outputName, matrix):
+    outputFilePath = Path(outputPath) / (outputName + '.csv')
+    statistics = matrix.statistics()
+
+    with open(outputFilePath, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Reagent", "Product", *statistics.keys()])
+        writer.writerows(zip(matrix.reagents.tolist(), matrix.products.tolist(), *[values.tolist() for values in statistics.values()]))
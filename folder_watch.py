@@ -0,0 +1,125 @@
+import os
+import time
+from pathlib import Path
+
+from input_catalog import CLIENT_FOLDER_PATTERN
+
+# Seconds between polls, a poll only stats folders and the files still being written
+POLL_SECONDS = 5.0
+
+# An export is ready once its size and mtime have held this long, exporters write in several passes
+SETTLE_SECONDS = 30.0
+
+
+def folderListing(folder):
+    # {name: (isDir, size, mtime_ns)}, empty when the folder is gone
+    listing = {}
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                listing[entry.name] = (entry.is_dir(), stat.st_size, stat.st_mtime_ns)
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return listing
+
+
+def fileState(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class FolderWatch:
+    # Notices exports arriving under the root by polling folder mtimes: the root, every client
+    # folder and their sub folders. Only a folder whose mtime moved is listed again. Creating a
+    # file moves its folder's mtime but writing to it doesn't, so files seen arriving are
+    # stat'ed on their own until they stop changing.
+    def __init__(self, rootDir, settleSeconds=SETTLE_SECONDS, clock=time.monotonic):
+        self.rootDir = Path(rootDir)
+        self.settleSeconds = settleSeconds
+        self.clock = clock
+
+        self.folderTimes = {}
+        self.listings = {}
+        # path -> (client folder, (size, mtime), when that state was first seen)
+        self.settling = {}
+
+        # Everything already there counts as seen
+        for _ in self.changes():
+            pass
+
+    def watchedFolders(self):
+        # (folder, client folder), read lazily so folders found by this pass are watched by it too
+        yield (self.rootDir, None)
+
+        for name, (isDir, _, _) in self.listings.get(self.rootDir, {}).items():
+            if not (isDir and CLIENT_FOLDER_PATTERN.match(name)):
+                continue
+
+            clientPath = self.rootDir / name
+            yield (clientPath, name)
+
+            for subDirName, (subIsDir, _, _) in self.listings.get(clientPath, {}).items():
+                if subIsDir:
+                    yield (clientPath / subDirName, name)
+
+    def changes(self):
+        # (client folder, path) for exports added, changed or removed in folders whose mtime moved
+        for folder, clientFolder in self.watchedFolders():
+            mtime = fileState(folder)
+            if mtime is not None and self.folderTimes.get(folder) == mtime[1]:
+                continue
+
+            before = self.listings.get(folder, {})
+            after = folderListing(folder)
+            self.listings[folder] = after
+
+            if mtime is None:
+                self.folderTimes.pop(folder, None)
+            else:
+                self.folderTimes[folder] = mtime[1]
+
+            # Exports sit in the sub folders, the root and client folders only lead to them
+            if clientFolder is None or folder.parent == self.rootDir:
+                continue
+
+            for name, state in after.items():
+                if not state[0] and before.get(name) != state:
+                    yield (clientFolder, folder / name)
+
+            for name in before.keys() - after.keys():
+                yield (clientFolder, folder / name)
+
+    def poll(self):
+        # Client folders whose changed exports have all stopped changing
+        now = self.clock()
+
+        for clientFolder, path in self.changes():
+            self.settling[path] = (clientFolder, fileState(path), now)
+
+        waiting = set()
+        settled = {}
+
+        for path, (clientFolder, state, since) in list(self.settling.items()):
+            current = fileState(path)
+            if current != state:
+                self.settling[path] = (clientFolder, current, now)
+                waiting.add(clientFolder)
+            elif now - since < self.settleSeconds:
+                waiting.add(clientFolder)
+            else:
+                settled.setdefault(clientFolder, []).append(path)
+
+        # A client is handed out only once every file it is waiting on has settled
+        ready = set(settled) - waiting
+        for clientFolder in ready:
+            for path in settled[clientFolder]:
+                del self.settling[path]
+
+        return ready
@@ -0,0 +1,125 @@
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from run_metrics import timed
+
+CLIENT_FOLDER_PATTERN = re.compile(r'AL-\d*')
+BASELINE_FOLDER_PATTERN = re.compile(r'0.*baseline.*|2.*mass.*')
+# Metabolite exports are only looked for in these, file names alone also match scans of e.g. AL-13
+METABOLITE_FOLDER_PATTERN = re.compile(r'3')
+MASS_SCAN_PATTERN = re.compile(r"2-Mass-Scan-pos-neg.* ([0-9]+)min.*\.csv$")
+METABOLITE_PATTERN = re.compile(r"3.* (-?[0-9]+)min.*\.csv$")
+
+# Manually Filter out relevant files
+# Adjust if needed
+BASELINE_NAME_MARKERS = [
+    'baseline',
+    ' 0min',
+    ' 0 min',
+    'neg3',
+    'neg7',
+    'neg 3',
+    'neg 7',
+    ' -3 ',
+    ' -7 ',
+    ' -3min',
+    ' -7min',
+]
+BASELINE_NAME_PATTERN = re.compile('|'.join(re.escape(marker) for marker in BASELINE_NAME_MARKERS), re.IGNORECASE)
+
+# Client folders are listed concurrently, directory reads on network mounts are mostly waiting
+CATALOG_THREADS = 8
+
+# members maps paths inside an archive to their bytes, see archive_tree
+ClientFiles = namedtuple('ClientFiles', ['client', 'baseline', 'massScans', 'metabolites', 'members'], defaults=(None,))
+
+
+def isBaselineFile(path):
+    return path.endswith('.csv') and BASELINE_NAME_PATTERN.search(path) is not None
+
+
+def classifyFiles(clientFolder, files):
+    # files yields (sub folder name, file name, path) for everything one level below the client folder
+    baseline = []
+    massScans = []
+    metabolites = []
+
+    for subDirName, fileName, path in files:
+        isBaselineFolder = BASELINE_FOLDER_PATTERN.match(subDirName.lower()) is not None
+
+        if isBaselineFolder and isBaselineFile(path):
+            baseline.append(path)
+
+        res = MASS_SCAN_PATTERN.search(fileName)
+        if res is not None:
+            massScans.append((path, int(res.group(1))))
+
+        res = METABOLITE_PATTERN.search(fileName) if METABOLITE_FOLDER_PATTERN.match(subDirName) else None
+        if res is not None:
+            metabolites.append((path, int(res.group(1))))
+
+    return ClientFiles(clientFolder, baseline, massScans, metabolites)
+
+
+def listClientFolder(clientPath):
+    for subDir in os.scandir(clientPath):
+        if not subDir.is_dir():
+            continue
+
+        for item in os.scandir(subDir.path):
+            yield (subDir.name, item.name, item.path)
+
+
+@timed("scanClient")
+def scanClient(clientFolder, rootDir):
+    return classifyFiles(clientFolder, listClientFolder(str(Path(rootDir) / clientFolder)))
+
+
+def findClientFolders(rootDir):
+    return sorted(
+        entry.name for entry in os.scandir(rootDir)
+        if CLIENT_FOLDER_PATTERN.match(entry.name) and entry.is_dir()
+    )
+
+
+class InputCatalog:
+    def __init__(self, rootDir, clients, errors=None):
+        self.rootDir = rootDir
+        self.clientFiles = {clientFiles.client: clientFiles for clientFiles in clients}
+        # Clients whose folder couldn't be listed, the run reports them as failed like any other client error
+        self.errors = errors or {}
+
+    @classmethod
+    def build(cls, rootDir, clientFolders=None, threads=CATALOG_THREADS):
+        if clientFolders is None:
+            clientFolders = findClientFolders(rootDir)
+
+        def scan(clientFolder):
+            try:
+                return (clientFolder, scanClient(clientFolder, rootDir), None)
+            except Exception as e:
+                return (clientFolder, None, e)
+
+        if threads <= 1:
+            scanned = [scan(clientFolder) for clientFolder in clientFolders]
+        else:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                scanned = list(executor.map(scan, clientFolders))
+
+        clients = [clientFiles for _, clientFiles, e in scanned if e is None]
+        errors = {clientFolder: e for clientFolder, _, e in scanned if e is not None}
+        return cls(rootDir, clients, errors)
+
+    def clients(self):
+        return sorted([*self.clientFiles, *self.errors])
+
+    def client(self, clientFolder):
+        return self.clientFiles[clientFolder]
+
+    def stream(self, clientFolders, needsData=None):
+        # Files on disk are read by the parsers themselves
+        for clientFolder in clientFolders:
+            yield self.client(clientFolder)
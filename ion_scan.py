@@ -0,0 +1,129 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+
+def ionKeys(reagents, products):
+    # Pack (reagent, product) into one sortable integer for joins
+    return (np.asarray(reagents, dtype=np.int64) << 32) | np.asarray(products, dtype=np.int64)
+
+
+class IonIndex:
+    # Every (reagent, product) seen by this process gets one slot, shared by all scans
+    def __init__(self):
+        self.keys = []
+        self.reagents = np.empty(0, dtype=np.int64)
+        self.products = np.empty(0, dtype=np.int64)
+        self.sortedKeys = np.empty(0, dtype=np.int64)
+        self.sortedSlots = np.empty(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, packed):
+        position = np.searchsorted(self.sortedKeys, packed)
+        found = position < len(self.sortedKeys)
+        found[found] = self.sortedKeys[position[found]] == packed[found]
+        return (position, found)
+
+    def slots(self, reagents, products):
+        packed = ionKeys(reagents, products)
+        (position, found) = self.find(packed)
+
+        if not found.all():
+            self.register(np.unique(packed[~found]))
+            (position, found) = self.find(packed)
+
+        return self.sortedSlots[position]
+
+    def slot(self, key):
+        (position, found) = self.find(ionKeys([key[0]], [key[1]]))
+        if not found[0]:
+            raise KeyError(key)
+        return self.sortedSlots[position[0]]
+
+    def register(self, packed):
+        reagents = (packed >> 32).tolist()
+        products = (packed & 0xFFFFFFFF).tolist()
+        self.keys.extend(zip(reagents, products))
+
+        self.reagents = np.concatenate((self.reagents, reagents)).astype(np.int64)
+        self.products = np.concatenate((self.products, products)).astype(np.int64)
+
+        allKeys = ionKeys(self.reagents, self.products)
+        order = np.argsort(allKeys)
+        self.sortedKeys = allKeys[order]
+        self.sortedSlots = order.astype(np.int32)
+
+
+ION_INDEX = IonIndex()
+
+
+class IonScan(Mapping):
+    # One intensity per ion: reads like {(reagent, product): [intensity]} without an object per ion
+    __slots__ = ('slots', 'intensities', 'positions')
+
+    def __init__(self, slots, intensities):
+        self.slots = np.asarray(slots, dtype=np.int32)
+        self.intensities = np.asarray(intensities, dtype=float)
+        self.positions = None
+
+    @classmethod
+    def fromArrays(cls, reagents, products, intensities):
+        return cls(ION_INDEX.slots(reagents, products), intensities)
+
+    @classmethod
+    def fromDict(cls, scanData):
+        reagents = [reagent for reagent, _ in scanData]
+        products = [product for _, product in scanData]
+        return cls.fromArrays(reagents, products, [values[0] for values in scanData.values()])
+
+    def __reduce__(self):
+        # Slots are only meaningful in this process, pickle the ions themselves
+        (reagents, products, intensities) = self.arrays()
+        return (IonScan.fromArrays, (reagents, products, intensities))
+
+    def arrays(self):
+        return (ION_INDEX.reagents[self.slots], ION_INDEX.products[self.slots], self.intensities)
+
+    def position(self, key):
+        if self.positions is None:
+            # Built on first keyed lookup, iteration doesn't need it
+            self.positions = np.full(len(ION_INDEX), -1, dtype=np.int32)
+            self.positions[self.slots] = np.arange(len(self.slots), dtype=np.int32)
+
+        try:
+            slot = ION_INDEX.slot(key)
+        except (KeyError, TypeError, IndexError):
+            raise KeyError(key)
+
+        if slot >= len(self.positions) or self.positions[slot] < 0:
+            raise KeyError(key)
+        return self.positions[slot]
+
+    def __getitem__(self, key):
+        return [self.intensities[self.position(key)].item()]
+
+    def __contains__(self, key):
+        try:
+            self.position(key)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __iter__(self):
+        keys = ION_INDEX.keys
+        return (keys[slot] for slot in self.slots.tolist())
+
+    # Built in one pass over the arrays, as lists so they have a length and iterate again like a dict's views
+    def values(self):
+        return [[intensity] for intensity in self.intensities.tolist()]
+
+    def items(self):
+        return list(zip(self, self.values()))
+
+    def __repr__(self):
+        return f"IonScan({dict(self.items())!r})"
@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+
+class Quarantine:
+    # Exports rejected as broken, skipped until their size or mtime changes
+    # The same file can be matched as more than one kind of export, entries are kept per kind
+    def __init__(self, manifestPath):
+        self.manifestPath = Path(manifestPath)
+        self.entries = {}
+        # Read-ahead threads look files up while the parsing thread adds them
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.manifestPath) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except (OSError, ValueError):
+            logging.warning(f"Ignoring unreadable quarantine manifest {self.manifestPath}")
+            self.entries = {}
+
+    def save(self):
+        self.entries = {kind: entries for kind, entries in self.entries.items() if len(entries) > 0}
+        if len(self.entries) == 0:
+            self.manifestPath.unlink(missing_ok=True)
+            return
+
+        self.manifestPath.parent.mkdir(parents=True, exist_ok=True)
+        tmpPath = self.manifestPath.with_name(f"{self.manifestPath.name}.{os.getpid()}.tmp")
+        with open(tmpPath, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmpPath, self.manifestPath)
+
+    def reason(self, fileName, kind):
+        with self.lock:
+            entry = self.entries.get(kind, {}).get(str(fileName))
+            if entry is None:
+                return None
+
+            try:
+                stat = os.stat(fileName)
+            except FileNotFoundError:
+                stat = None
+
+            if stat is None or (stat.st_size, stat.st_mtime_ns) != (entry["size"], entry["mtime"]):
+                # Changed since it was rejected, it gets validated again
+                del self.entries[kind][str(fileName)]
+                self.save()
+                return None
+
+            return entry["reason"]
+
+    def add(self, fileName, kind, reason):
+        try:
+            stat = os.stat(fileName)
+        except (FileNotFoundError, NotADirectoryError):
+            # Archive members have no stat of their own, the archive's freshness covers them
+            return
+
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "reason": reason}
+
+        with self.lock:
+            entries = self.entries.setdefault(kind, {})
+            if entries.get(str(fileName)) != entry:
+                entries[str(fileName)] = entry
+                self.save()
+
+
+    def retain(self, kindPaths):
+        # Drops entries for files no longer cataloged as that kind, kindPaths maps kind -> paths
+        with self.lock:
+            kept = {kind: {fileName: entry for fileName, entry in entries.items()
+                           if fileName in {str(path) for path in kindPaths.get(kind, ())}}
+                    for kind, entries in self.entries.items()}
+            if kept != self.entries:
+                self.entries = kept
+                self.save()
+
+
+def quarantinedFiles(quarantineFolder):
+    # Every rejected export across the per-client manifests
+    entries = {}
+    if not Path(quarantineFolder).is_dir():
+        return entries
+
+    for manifestPath in sorted(Path(quarantineFolder).glob("*.json")):
+        for kind, kindEntries in Quarantine(manifestPath).entries.items():
+            entries.update({(kind, fileName): entry for fileName, entry in kindEntries.items()})
+    return entries
+
+
+def quarantinedClients(quarantineFolder):
+    # Clients with at least one rejected export, empty manifests are removed when saved
+    return sorted(path.stem for path in Path(quarantineFolder).glob("*.json"))
@@ -0,0 +1,56 @@
+import threading
+from queue import Empty, Full, Queue
+
+# Items fetched ahead of the consumer, bounds the memory held by the queue
+DEFAULT_DEPTH = 4
+
+DONE = object()
+
+
+def readAhead(items, fetch, depth=DEFAULT_DEPTH):
+    # Yields (item, fetch(item)) in order, fetching on a background thread while the caller works on earlier items
+    queue = Queue(maxsize=depth)
+    stopped = threading.Event()
+
+    def put(entry):
+        # Blocks while the queue is full, gives up once the consumer has gone away
+        while not stopped.is_set():
+            try:
+                queue.put(entry, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce():
+        for item in items:
+            try:
+                entry = (item, fetch(item), None)
+            except Exception as e:
+                entry = (item, None, e)
+
+            if not put(entry):
+                return
+        put(DONE)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            entry = queue.get()
+            if entry is DONE:
+                return
+
+            (item, value, error) = entry
+            if error is not None:
+                raise error
+            yield (item, value)
+    finally:
+        stopped.set()
+        try:
+            while True:
+                queue.get_nowait()
+        except Empty:
+            pass
+        producer.join()
@@ -1,5 +1,6 @@
 import os
 import re
+from functools import lru_cache
 from pathlib import Path
 from reportlab.lib.colors import HexColor
 from reportlab.graphics.shapes import (Drawing, Rect, String, Line, Group)
@@ -13,52 +14,30 @@ from reportlab.lib.pagesizes import letter
 # from al_syft import OUTPUT_FOLDER
 import csv
 
+from chart_data import CHART_MAX_PRODUCT, chartSeries, scanSeries
+from run_metrics import timed
+from scan_compare import compareScans
+
 LINEPLOT_COLORMAP = [
     HexColor('#0e70f0'),
     HexColor("#fc8003"),
     HexColor("#ff1c6f"),
 ]
 
-def drawChart(scanData, y_min=0, y_max=2_000_000):
-    drawing = Drawing(400, 200)  # Define drawing dimensions
-    # Sample data for the line plot
-    # Each inner list represents a series of (x, y) points
-    data_to_plot = {}
-    for row in scanData:
-        reagent, product, intensity, *other = row
-        if reagent not in data_to_plot:
-            data_to_plot[reagent] = []
-
-        # Manually filter out too high values
-        if int(product) <= 150:
-            data_to_plot[reagent].append((int(product), float(intensity)))
-    lp = LinePlot()
-    lp.height = letter[1] * 0.1  # Height of the chart area
-    lp.width = letter[0] * 0.65  # Width of the chart area
-    lp.data = list(data_to_plot.values())  # Assign the data to the line plot
-    lp.xValueAxis.valueMin = 0
-    lp.xValueAxis.valueMax = 150
-    lp.yValueAxis.valueMin = y_min
-    lp.yValueAxis.valueMax = y_max
-    lp.yValueAxis.labels.fontName = "Montserrat"
-    lp.xValueAxis.labels.fontName = "Montserrat"
-    lp.yValueAxis.visibleGrid = 1
-    lp.yValueAxis.gridStrokeColor = HexColor("#a0a0a0")
+FONT_PATH = Path(__file__).parent / "Montserrat.ttf"
 
-    for i in range(len(list(data_to_plot.values()))):
-        lp.lines[i].strokeColor = LINEPLOT_COLORMAP[i % len(LINEPLOT_COLORMAP)]
-    legend = LineLegend()
-    legend.x = lp.x + lp.width + 10
-    legend.y = lp.y + lp.height
-    legend.colorNamePairs = list(
-        zip(LINEPLOT_COLORMAP, data_to_plot.keys())
-    )
-    legend.fontName = 'Montserrat'
-    legend.fontSize = 8
-    drawing.add(lp)
-    drawing.add(legend)
+@timed("registerFonts")
+def registerFonts():
+    # Parsing the TTF is expensive, only do it once per process
+    if "Montserrat" not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont("Montserrat", str(FONT_PATH)))
+
+@lru_cache(maxsize=None)
+def chartLabels():
+    # Axis titles are identical for every chart, build them once and share them
+    labels = Group()
 
-    drawing.add(String(
+    labels.add(String(
         225,
         -10,
         "Mass (AMU)",
@@ -76,9 +55,9 @@ def drawChart(scanData, y_min=0, y_max=2_000_000):
         fontName='Montserrat',
         fontSize=10
     ))
-    drawing.add(y_label)
+    labels.add(y_label)
 
-    drawing.add(String(
+    labels.add(String(
         450,
         100,
         "Reagent",
@@ -87,27 +66,71 @@ def drawChart(scanData, y_min=0, y_max=2_000_000):
         fontSize=8,
     ))
 
+    return labels
+
+def initRenderWorker():
+    registerFonts()
+    chartLabels()
+
+def drawChart(scanData, y_min=0, y_max=2_000_000):
+    return drawSeriesChart(scanSeries(scanData), y_min, y_max)
+
+def drawSeriesChart(data_to_plot, y_min=0, y_max=2_000_000):
+    drawing = Drawing(400, 200)  # Define drawing dimensions
+    # One line per reagent, each a list of (product, intensity) points
+    lp = LinePlot()
+    lp.height = letter[1] * 0.1  # Height of the chart area
+    lp.width = letter[0] * 0.65  # Width of the chart area
+    lp.data = list(data_to_plot.values())  # Assign the data to the line plot
+    lp.xValueAxis.valueMin = 0
+    lp.xValueAxis.valueMax = CHART_MAX_PRODUCT
+    lp.yValueAxis.valueMin = y_min
+    lp.yValueAxis.valueMax = y_max
+    lp.yValueAxis.labels.fontName = "Montserrat"
+    lp.xValueAxis.labels.fontName = "Montserrat"
+    lp.yValueAxis.visibleGrid = 1
+    lp.yValueAxis.gridStrokeColor = HexColor("#a0a0a0")
+
+    for i in range(len(list(data_to_plot.values()))):
+        lp.lines[i].strokeColor = LINEPLOT_COLORMAP[i % len(LINEPLOT_COLORMAP)]
+    legend = LineLegend()
+    legend.x = lp.x + lp.width + 10
+    legend.y = lp.y + lp.height
+    legend.colorNamePairs = list(
+        zip(LINEPLOT_COLORMAP, map(str, data_to_plot.keys()))
+    )
+    legend.fontName = 'Montserrat'
+    legend.fontSize = 8
+    drawing.add(lp)
+    drawing.add(legend)
+    drawing.add(chartLabels())
 
     has_data = len(data_to_plot) > 0
     return has_data, drawing
 
-def drawMetaboliteData(metaboliteBaselinePath, metabolite30minPath):
-    with open(metaboliteBaselinePath, "r") as f:
-        reader = csv.reader(f)
-        baselineData = list(reader)[1:]
+def readScanCsv(scanPath):
+    scanData = {}
 
-    with open(metabolite30minPath, "r") as f:
-        reader = csv.reader(f)
-        min30Data = list(reader)[1:]
+    if scanPath.is_file():
+        with open(scanPath, "r") as f:
+            reader = csv.reader(f)
+            for reagent, product, *values in list(reader)[1:]:
+                # Clients missing an ion leave an empty cell in the consolidated baseline
+                scanData[(int(reagent), int(product))] = [float(value) if value != '' else float('nan') for value in values]
+
+    return scanData
 
-    baselineData = {
-        analyte: float(concentration) for analyte, concentration in baselineData
-    }
+def readMetaboliteCsv(metabolitePath):
+    if not os.path.exists(metabolitePath):
+        return None
 
-    min30Data = {
-        analyte: float(concentration) for analyte, concentration in min30Data
-    }
+    with open(metabolitePath, "r") as f:
+        reader = csv.reader(f)
+        return {
+            analyte: float(concentration) for analyte, concentration in list(reader)[1:]
+        }
 
+def drawMetaboliteData(baselineData, min30Data):
     drawingWidth = letter[0] * 0.8
     drawing = Drawing(drawingWidth, 200)
 
@@ -169,25 +192,31 @@ def renderClientPDF(baselinePath, scanData30Path, metaboliteBaselinePath, metabo
     id_number = res.group(1)
 
     output_file = Path(baselinePath).with_stem(id_number).with_suffix(".pdf")
-    print(f"Rendering {baselinePath} to {output_file}")
 
-    baselineData = {}
-    scan30Data = {}
+    return renderClientReport(
+        id_number,
+        output_file,
+        readScanCsv(baselinePath),
+        readScanCsv(scanData30Path),
+        readMetaboliteCsv(metaboliteBaselinePath),
+        readMetaboliteCsv(metabolite30minPath),
+    )
 
-    if baselinePath.is_file():
-        with open(baselinePath, "r") as f:
-            reader = csv.reader(f)
-            baselineData = list(reader)[1:]
 
-    if scanData30Path.is_file():
-        with open(scanData30Path, "r") as f:
-            reader = csv.reader(f)
-            scan30Data = list(reader)[1:]
+@timed("renderClientReport")
+def renderClientReport(id_number, output_file, baselineData, scan30Data, metaboliteBaseline, metabolite30min, comparison30=None):
+    print(f"Rendering {id_number} to {output_file}")
 
-    pdfmetrics.registerFont(TTFont("Montserrat", "./Montserrat.ttf"))
+    registerFonts()
 
     c = canvas.Canvas(str(output_file), pagesize=letter)
+    drawClientPage(c, id_number, baselineData, scan30Data, metaboliteBaseline, metabolite30min, comparison30)
+    c.save()
+
+    return output_file
 
+
+def drawClientPage(c, id_number, baselineData, scan30Data, metaboliteBaseline, metabolite30min, comparison30=None):
     c.setFont("Montserrat", 28)
     c.drawCentredString(letter[0] * 0.5, letter[1] * 0.91, id_number)
 
@@ -196,11 +225,11 @@ def renderClientPDF(baselinePath, scanData30Path, metaboliteBaselinePath, metabo
 
     hasBaselineData, baselineDrawing = drawChart(baselineData)
 
-    hasMetaboliteBaseline = os.path.exists(metaboliteBaselinePath)
-    hasMetabolite30min = os.path.exists(metabolite30minPath)
+    hasMetaboliteBaseline = metaboliteBaseline is not None
+    hasMetabolite30min = metabolite30min is not None
 
     if hasMetaboliteBaseline and hasMetabolite30min:
-        chart = drawMetaboliteData(metaboliteBaselinePath, metabolite30minPath)
+        chart = drawMetaboliteData(metaboliteBaseline, metabolite30min)
         chart.drawOn(c, letter[0] * 0.13, letter[1] * 0.7)
     else:
         c.drawCentredString(letter[0] * 0.5, letter[1] * 0.8, "No Mass Scan Metabolite Data")
@@ -223,20 +252,15 @@ def renderClientPDF(baselinePath, scanData30Path, metaboliteBaselinePath, metabo
     else:
         c.drawCentredString(letter[0] * 0.5, chartsStart - chartSpacing + chartTitleSpacing, "No Mass Scan 30 mins")
 
-    if hasMassScan30 and hasBaselineData:
-        scanDifferneceData = []
-
-        for i, row in enumerate(scan30Data):
-            reagent30, product30, intensity30, *other = row
-            _, _, intensityBaseline, *other = baselineData[i]
+    if hasMassScan30 and hasBaselineData and comparison30 is None:
+        comparison30 = compareScans(baselineData, scan30Data)
 
-            scanDifferneceData.append(
-                [reagent30, product30, float(intensity30) - float(intensityBaseline)]
-            )
+    if hasMassScan30 and hasBaselineData and len(comparison30.delta) > 0:
+        scanDifferneceData = chartSeries(comparison30.reagents, comparison30.products, comparison30.delta)
 
-        _, _, differneces = zip(*scanDifferneceData)
+        differneces = comparison30.delta
 
-        _, massScanDifferenceDrawing = drawChart(scanDifferneceData, y_min=min(differneces), y_max=max(differneces))
+        _, massScanDifferenceDrawing = drawSeriesChart(scanDifferneceData, y_min=differneces.min(), y_max=differneces.max())
 
         c.drawCentredString(letter[0] * 0.5,  chartsStart - chartSpacing * 2 + chartTitleSpacing, "Mass Scan Difference")
         massScanDifferenceDrawing.drawOn(c, letter[0] * 0.16,  chartsStart - chartSpacing * 2)
@@ -244,28 +268,29 @@ def renderClientPDF(baselinePath, scanData30Path, metaboliteBaselinePath, metabo
         c.drawCentredString(letter[0] * 0.5,  chartsStart - chartSpacing * 2 + chartTitleSpacing, "No Mass Scan baseline or 30 mins")
 
     c.showPage()
-    c.save()
 
 
 def renderAverageBaseline(consoladatedBaselinePath):
 
     output_file = Path(consoladatedBaselinePath).with_suffix(".pdf")
-    print(f"Rendering {consoladatedBaselinePath} to {output_file}")
-    # id_number = Path(baselinePath).stem
 
+    return renderAverageBaselineReport(output_file, readScanCsv(consoladatedBaselinePath))
 
-    baselineData = {}
 
-    if consoladatedBaselinePath.is_file():
-        with open(consoladatedBaselinePath, "r") as f:
-            reader = csv.reader(f)
-            baselineData = list(reader)[1:]
+@timed("renderAverageBaselineReport")
+def renderAverageBaselineReport(output_file, baselineData):
+    print(f"Rendering average baseline to {output_file}")
 
-
-    pdfmetrics.registerFont(TTFont("Montserrat", "./Montserrat.ttf"))
+    registerFonts()
 
     c = canvas.Canvas(str(output_file), pagesize=letter)
+    drawAverageBaselinePage(c, baselineData)
+    c.save()
 
+    return output_file
+
+
+def drawAverageBaselinePage(c, baselineData):
     c.setFont("Montserrat", 14)
     c.drawCentredString(letter[0] * 0.5, letter[1] * 0.885, "Average Baseline")
 
@@ -278,5 +303,23 @@ def renderAverageBaseline(consoladatedBaselinePath):
         c.drawCentredString(letter[0] * 0.5, letter[1] * 0.7, "No Baseline Scan")
 
     c.showPage()
+
+
+@timed("renderCohortReport")
+def renderCohortReport(output_file, clientPages, averageBaselineData=None):
+    print(f"Rendering cohort report to {output_file}")
+
+    registerFonts()
+
+    # One document for the whole cohort, the font subset is embedded only once
+    c = canvas.Canvas(str(output_file), pagesize=letter)
+
+    if averageBaselineData is not None:
+        drawAverageBaselinePage(c, averageBaselineData)
+
+    for clientPage in clientPages:
+        drawClientPage(c, *clientPage)
+
     c.save()
 
+    return output_file
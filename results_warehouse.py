@@ -0,0 +1,146 @@
+import sqlite3
+from pathlib import Path
+
+from ion_scan import IonScan
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS clients (
+        client TEXT PRIMARY KEY,
+        parsed INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS ionIntensities (
+        client TEXT NOT NULL,
+        timepoint TEXT NOT NULL,
+        reagent INTEGER NOT NULL,
+        product INTEGER NOT NULL,
+        intensity REAL,
+        PRIMARY KEY (client, timepoint, reagent, product)
+    ) WITHOUT ROWID""",
+    # Cohort lookups go by ion first, one client's rows by the primary key
+    "CREATE INDEX IF NOT EXISTS ionIntensitiesByIon ON ionIntensities (reagent, product, timepoint)",
+    """CREATE TABLE IF NOT EXISTS metaboliteConcentrations (
+        client TEXT NOT NULL,
+        timepoint TEXT NOT NULL,
+        analyte TEXT NOT NULL,
+        concentration REAL,
+        PRIMARY KEY (client, timepoint, analyte)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS metaboliteConcentrationsByAnalyte ON metaboliteConcentrations (analyte, timepoint)",
+]
+
+
+def ionRows(clientFolder, timepoint, scanData):
+    # The first value is the one every report uses, the baseline's average
+    for (reagent, product), values in scanData.items():
+        yield (clientFolder, timepoint, reagent, product, values[0])
+
+
+def metaboliteRows(clientFolder, timepoint, scanResults):
+    for analyte, concentration in scanResults.items():
+        yield (clientFolder, timepoint, analyte, concentration)
+
+
+# Seconds a node waits for another node's write to finish on a shared warehouse
+SHARED_BUSY_SECONDS = 60
+
+
+class ResultsWarehouse:
+    # Every client's parsed intensities and concentrations in one SQLite file, written by the main process only.
+    # shared is for a file several nodes write, e.g. in the results folder of a --work-dir run
+    def __init__(self, path, shared=False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        if shared:
+            # WAL keeps its index in shared memory, which only works between processes on one host.
+            # A rollback journal relies on file locks alone
+            self.connection = sqlite3.connect(self.path, timeout=SHARED_BUSY_SECONDS)
+            self.connection.execute("PRAGMA journal_mode=DELETE")
+        else:
+            self.connection = sqlite3.connect(self.path)
+            # Readers such as a notebook can query while a run writes
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def parsed(self, clientFolder):
+        # When the stored rows were parsed, as the client data's mtime, None if never stored
+        row = self.connection.execute("SELECT parsed FROM clients WHERE client = ?", (clientFolder,)).fetchone()
+        return None if row is None else row[0]
+
+    def storeClient(self, clientFolder, parsed, baselineData, massScans, metabolites):
+        # massScans and metabolites map a time point label to the scan data
+        with self.connection:
+            self.deleteClient(clientFolder)
+
+            self.connection.execute("INSERT INTO clients VALUES (?, ?)", (clientFolder, parsed))
+            self.connection.executemany(
+                "INSERT INTO ionIntensities VALUES (?, ?, ?, ?, ?)", ionRows(clientFolder, "baseline", baselineData)
+            )
+            for timepoint, scanData in massScans.items():
+                self.connection.executemany(
+                    "INSERT INTO ionIntensities VALUES (?, ?, ?, ?, ?)", ionRows(clientFolder, timepoint, scanData)
+                )
+            for timepoint, scanResults in metabolites.items():
+                self.connection.executemany(
+                    "INSERT INTO metaboliteConcentrations VALUES (?, ?, ?, ?)", metaboliteRows(clientFolder, timepoint, scanResults)
+                )
+
+    def deleteClient(self, clientFolder):
+        for table in ("clients", "ionIntensities", "metaboliteConcentrations"):
+            self.connection.execute(f"DELETE FROM {table} WHERE client = ?", (clientFolder,))
+
+    def retain(self, clientFolders):
+        # Drops clients whose parsed data is gone from the results folder
+        with self.connection:
+            for clientFolder in set(self.clients()) - set(clientFolders):
+                self.deleteClient(clientFolder)
+
+    def clients(self):
+        return [client for (client,) in self.connection.execute("SELECT client FROM clients ORDER BY client")]
+
+    def ion(self, reagent, product, timepoint="baseline"):
+        # {client: intensity} for one ion across the cohort
+        return dict(self.connection.execute(
+            "SELECT client, intensity FROM ionIntensities WHERE reagent = ? AND product = ? AND timepoint = ? ORDER BY client",
+            (reagent, product, timepoint),
+        ))
+
+    def metabolite(self, analyte, timepoint="baseline"):
+        return dict(self.connection.execute(
+            "SELECT client, concentration FROM metaboliteConcentrations WHERE analyte = ? AND timepoint = ? ORDER BY client",
+            (analyte, timepoint),
+        ))
+
+    def clientIons(self, clientFolder, timepoint="baseline"):
+        rows = self.connection.execute(
+            "SELECT reagent, product, intensity FROM ionIntensities WHERE client = ? AND timepoint = ?",
+            (clientFolder, timepoint),
+        ).fetchall()
+        return IonScan.fromArrays([row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows])
+
+    def timepoint(self, timepoint="baseline"):
+        # {client: IonScan} for one time point, in one query
+        rows = {}
+        for client, reagent, product, intensity in self.connection.execute(
+            "SELECT client, reagent, product, intensity FROM ionIntensities WHERE timepoint = ? ORDER BY client",
+            (timepoint,),
+        ):
+            rows.setdefault(client, []).append((reagent, product, intensity))
+
+        return {
+            client: IonScan.fromArrays([row[0] for row in ions], [row[1] for row in ions], [row[2] for row in ions])
+            for client, ions in rows.items()
+        }
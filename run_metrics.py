@@ -0,0 +1,145 @@
+import cProfile
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+
+COHORT = "cohort"
+
+
+def emptyStage():
+    return {
+        "calls": 0,
+        "wallSeconds": 0.0,
+        "cpuSeconds": 0.0,
+        "bytesRead": 0,
+        "rowsParsed": 0,
+        "incompleteFiles": 0,
+        "quarantinedFiles": 0,
+        "cacheHits": 0,
+    }
+
+
+# client -> stage -> counters, for everything run in this process
+collected = defaultdict(lambda: defaultdict(emptyStage))
+currentClient = COHORT
+
+# Stages being timed, per thread so CSV writer threads don't interleave with rendering
+local = threading.local()
+
+
+def activeStages():
+    if not hasattr(local, 'stages'):
+        local.stages = []
+    return local.stages
+
+
+def timed(stage):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            stages = activeStages()
+            stages.append(stage)
+            wallStart = time.perf_counter()
+            cpuStart = time.process_time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                counters = collected[currentClient][stage]
+                counters["calls"] += 1
+                counters["wallSeconds"] += time.perf_counter() - wallStart
+                counters["cpuSeconds"] += time.process_time() - cpuStart
+                stages.pop()
+        return wrapper
+    return decorator
+
+
+def addMetric(name, value=1):
+    # Counted against the innermost stage being timed
+    stages = activeStages()
+    stage = stages[-1] if stages else "other"
+    collected[currentClient][stage][name] += value
+
+
+def takeMetrics():
+    snapshot = {client: {stage: dict(counters) for stage, counters in stages.items()} for client, stages in collected.items()}
+    collected.clear()
+    return snapshot
+
+
+def measured(fn, clientFolder, profilePath, *args):
+    # Runs one client's stage, in a worker or in-process, and hands back its metrics with the result
+    global currentClient
+    currentClient = clientFolder
+
+    profiler = None
+    if profilePath is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        result = timed(fn.__name__)(fn)(*args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            Path(profilePath).parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(profilePath)
+        currentClient = COHORT
+
+    return (result, takeMetrics())
+
+
+class RunMetrics:
+    def __init__(self):
+        self.started = datetime.now()
+        self.wallStart = time.perf_counter()
+        self.clients = defaultdict(lambda: defaultdict(emptyStage))
+
+    def merge(self, snapshot):
+        for client, stages in snapshot.items():
+            for stage, counters in stages.items():
+                merged = self.clients[client][stage]
+                for name, value in counters.items():
+                    merged[name] += value
+
+    def stageTotals(self):
+        totals = defaultdict(emptyStage)
+        for stages in self.clients.values():
+            for stage, counters in stages.items():
+                for name, value in counters.items():
+                    totals[stage][name] += value
+        return totals
+
+    def write(self, metricsFolder, node=None):
+        # Work done in this process, e.g. discovery and the cohort stages
+        self.merge(takeMetrics())
+
+        metricsFolder = Path(metricsFolder)
+        metricsFolder.mkdir(parents=True, exist_ok=True)
+        # Nodes sharing a run write their own files
+        suffix = f"-{node}" if node else ""
+        stem = f"run-{self.started:%Y%m%d-%H%M%S-%f}{suffix}"
+
+        # Never replaces another run's file, a clash gets a counter instead
+        outputFile = metricsFolder / f"{stem}.json"
+        count = 1
+        while True:
+            try:
+                f = open(outputFile, 'x')
+                break
+            except FileExistsError:
+                outputFile = metricsFolder / f"{stem}-{count}.json"
+                count += 1
+
+        with f:
+            json.dump({
+                "started": self.started.isoformat(timespec="seconds"),
+                "wallSeconds": time.perf_counter() - self.wallStart,
+                "stages": self.stageTotals(),
+                "clients": self.clients,
+            }, f, indent=2, sort_keys=True)
+
+        return outputFile
@@ -0,0 +1,224 @@
+import hashlib
+import logging
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from run_metrics import addMetric
+from scan_parser import ScanArray, SCAN_ROW_START, SCAN_ROW_END, FILTERED_IONS, METABOLITE_ANALYTES
+
+# Bump when the stored layout changes
+CACHE_VERSION = 2
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# Each process reads the cache's size from disk again after writing this share of the limit,
+# so workers sharing the cache see each other's entries and keep within a few percent of it
+RESCAN_FRACTION = 0.01
+
+
+def parserFingerprint():
+    # Anything that changes what a parse returns has to change this
+    settings = repr((
+        CACHE_VERSION,
+        SCAN_ROW_START,
+        SCAN_ROW_END,
+        sorted(FILTERED_IONS.items()),
+        METABOLITE_ANALYTES,
+    ))
+    return hashlib.blake2b(settings.encode(), digest_size=8).hexdigest()
+
+
+def hashFile(fileName):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(fileName, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+        addMetric("bytesRead", f.tell())
+    return digest.hexdigest()
+
+
+def hashContent(content):
+    # Same digest as hashFile, for a file that is already mapped
+    addMetric("bytesRead", len(content))
+    return hashlib.blake2b(content, digest_size=20).hexdigest()
+
+
+def serialize(kind, value):
+    if value is None:
+        return {'incomplete': np.array(True)}
+
+    if kind == 'scan':
+        return value._asdict()
+
+    return {'concentrations': np.array([value[analyte] for analyte in METABOLITE_ANALYTES])}
+
+
+def deserialize(kind, stored):
+    if 'incomplete' in stored:
+        return None
+
+    if kind == 'scan':
+        return ScanArray(*[stored[field] for field in ScanArray._fields])
+
+    return dict(zip(METABOLITE_ANALYTES, stored['concentrations'].tolist()))
+
+
+class ScanCache:
+    def __init__(self, cacheDir, maxBytes=DEFAULT_MAX_BYTES):
+        self.cacheDir = Path(cacheDir)
+        self.maxBytes = maxBytes
+        self.fingerprint = parserFingerprint()
+        self.entriesDir = self.cacheDir / self.fingerprint / 'entries'
+        self.refsDir = self.cacheDir / self.fingerprint / 'refs'
+        # None until the first write, which reads the size from disk
+        self.writtenSinceScan = None
+
+    def statKey(self, fileName):
+        # Cheap pre-check: an unchanged size and mtime means an unchanged hash
+        stat = os.stat(fileName)
+        key = f"{os.path.abspath(fileName)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    def fileHash(self, fileName, content=None):
+        # content is the file's mapping when the caller already has one, it is hashed instead of reading the file again
+        refPath = self.refsDir / self.statKey(fileName)
+
+        try:
+            digest = refPath.read_text()
+            # Refs age with the entries they lead to, see evict
+            os.utime(refPath)
+            return digest
+        except FileNotFoundError:
+            pass
+
+        digest = hashFile(fileName) if content is None else hashContent(content)
+        self.refsDir.mkdir(parents=True, exist_ok=True)
+        writeAtomic(refPath, digest.encode())
+        return digest
+
+    def contentKey(self, fileName, kind, content=None):
+        return f"{kind}-{self.fileHash(fileName, content)}"
+
+    def lookup(self, fileName, kind, content=None):
+        # Returns (entryPath, found, value), a miss is stored later with put(entryPath, ...)
+        key = self.contentKey(fileName, kind, content)
+        entryPath = self.entriesDir / (key + '.npz')
+
+        try:
+            with np.load(entryPath) as stored:
+                value = deserialize(kind, stored)
+            os.utime(entryPath)
+            addMetric("cacheHits")
+            return (entryPath, True, value)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError):
+            logging.warning(f"Discarding corrupt cache entry {entryPath}")
+
+        return (entryPath, False, None)
+
+    def put(self, entryPath, kind, value):
+        self.entriesDir.mkdir(parents=True, exist_ok=True)
+
+        tmpPath = entryPath.with_name(f"{entryPath.stem}.{os.getpid()}.tmp.npz")
+        np.savez(tmpPath, **serialize(kind, value))
+        os.replace(tmpPath, entryPath)
+        self.trackSize(entryPath)
+
+    def trackSize(self, path):
+        # Other processes write to the same cache, so the size is read from disk, not counted here
+        if self.writtenSinceScan is not None:
+            self.writtenSinceScan += path.stat().st_size
+            if self.writtenSinceScan < self.maxBytes * RESCAN_FRACTION:
+                return
+
+        self.writtenSinceScan = 0
+        entries = self.entries()
+        if sum(size for _, size, _ in entries) > self.maxBytes:
+            self.evict(entries)
+
+    def entries(self):
+        # Parse results and the refs leading to them share the size limit
+        entries = []
+
+        for folder in (self.entriesDir, self.refsDir):
+            if not folder.is_dir():
+                continue
+
+            for entry in os.scandir(folder):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self, entries=None):
+        # Drop least recently used files until well under the limit
+        if entries is None:
+            entries = self.entries()
+        entries = sorted(entries, key=lambda entry: entry[2])
+        totalBytes = sum(size for _, size, _ in entries)
+        target = self.maxBytes * 0.9
+
+        kept = len(entries)
+        for path, size, _ in entries:
+            if totalBytes <= target:
+                break
+            removeFile(path)
+            totalBytes -= size
+            kept -= 1
+
+        self.removeOrphanedRefs([path for path, _, _ in entries[len(entries) - kept:]])
+
+    def removeOrphanedRefs(self, kept):
+        # A ref whose entries were evicted only costs space, the file is hashed again anyway
+        refsDir = str(self.refsDir)
+        hashes = set()
+        refs = []
+        for path in kept:
+            if os.path.dirname(path) == refsDir:
+                refs.append(path)
+            else:
+                # entries are <kind>-<hash>.npz
+                hashes.add(os.path.basename(path).split('.')[0].split('-')[-1])
+
+        for path in refs:
+            try:
+                with open(path) as f:
+                    digest = f.read()
+            except FileNotFoundError:
+                continue
+            if digest not in hashes:
+                removeFile(path)
+
+    def invalidate(self):
+        # Remove entries written with a different row window or filter table
+        if not self.cacheDir.is_dir():
+            return
+
+        for entry in os.scandir(self.cacheDir):
+            if entry.is_dir() and entry.name != self.fingerprint:
+                logging.info(f"Removing stale scan cache {entry.path}")
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def clear(self):
+        shutil.rmtree(self.cacheDir, ignore_errors=True)
+        self.writtenSinceScan = None
+
+
+def removeFile(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def writeAtomic(path, content):
+    tmpPath = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmpPath, 'wb') as f:
+        f.write(content)
+    os.replace(tmpPath, path)
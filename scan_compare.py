@@ -0,0 +1,98 @@
+import csv
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from ion_scan import IonScan, ionKeys
+
+ScanComparison = namedtuple('ScanComparison', ['reagents', 'products', 'baseline', 'other', 'delta', 'ratio', 'foldChange'])
+
+
+def scanToArrays(scanData):
+    if isinstance(scanData, IonScan):
+        return scanData.arrays()
+
+    keys = list(scanData.keys())
+    reagents = np.fromiter((reagent for reagent, _ in keys), dtype=np.int64, count=len(keys))
+    products = np.fromiter((product for _, product in keys), dtype=np.int64, count=len(keys))
+    intensities = np.fromiter((values[0] for values in scanData.values()), dtype=float, count=len(keys))
+    return (reagents, products, intensities)
+
+
+def compareScans(baselineData, otherData):
+    (baselineReagents, baselineProducts, baselineIntensities) = scanToArrays(baselineData)
+    (otherReagents, otherProducts, otherIntensities) = scanToArrays(otherData)
+
+    # Index join on the ion key, only ions present in both scans are compared
+    _, baselineIndex, otherIndex = np.intersect1d(
+        ionKeys(baselineReagents, baselineProducts),
+        ionKeys(otherReagents, otherProducts),
+        assume_unique=True,
+        return_indices=True,
+    )
+
+    baseline = baselineIntensities[baselineIndex]
+    other = otherIntensities[otherIndex]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(baseline != 0, other / baseline, np.nan)
+        foldChange = np.log2(ratio)
+
+    return ScanComparison(
+        baselineReagents[baselineIndex],
+        baselineProducts[baselineIndex],
+        baseline,
+        other,
+        other - baseline,
+        ratio,
+        foldChange,
+    )
+
+
+def compareTimepoints(baselineData, scansByTime):
+    if len(baselineData) == 0:
+        return {}
+
+    return {
+        time: compareScans(baselineData, scanData)
+        for time, scanData in scansByTime.items() if len(scanData) > 0
+    }
+
+
+def comparisonToDict(comparison, field='delta'):
+    return {
+        (reagent, product): [value] for reagent, product, value in
+        zip(comparison.reagents.tolist(), comparison.products.tolist(), getattr(comparison, field).tolist())
+    }
+
+
+def cohortDeltaTable(clientComparisons):
+    # Flatten every client and time point into one set of columns
+    clients = []
+    times = []
+    comparisons = []
+    for clientFolder in sorted(clientComparisons):
+        for time, comparison in sorted(clientComparisons[clientFolder].items()):
+            clients.extend([clientFolder] * len(comparison.delta))
+            times.extend([time] * len(comparison.delta))
+            comparisons.append(comparison)
+
+    if len(comparisons) == 0:
+        columns = [np.array([]) for _ in ScanComparison._fields]
+    else:
+        columns = [np.concatenate(field) for field in zip(*comparisons)]
+
+    return (clients, times, ScanComparison(*columns))
+
+
+def writeDeltaTable(outputPath, outputName, clientComparisons, append=False):
+    # append adds rows to an existing table, for clients sorting after every client already in it
+    outputFilePath = Path(outputPath) / (outputName + '.csv')
+    (clients, times, table) = cohortDeltaTable(clientComparisons)
+
+    with open(outputFilePath, 'a' if append else 'w') as f:
+        writer = csv.writer(f)
+        if not append:
+            writer.writerow(["Client", "Minutes", "Reagent", "Product", "Baseline", "Intensity", "Delta", "Ratio", "Log2 Fold Change"])
+        writer.writerows(zip(clients, times, *[column.tolist() for column in table]))
@@ -0,0 +1,238 @@
+import csv
+import io
+import itertools
+import logging
+import mmap
+import os
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+from run_metrics import addMetric
+
+# Rows of the instrument export holding the reagent / product / intensity block
+SCAN_ROW_START = 266
+SCAN_ROW_END = 1424
+
+# Manually Filter Some Combinations
+FILTERED_IONS = {
+    19: (19, 37),
+    30: (30,),
+    32: (32,),
+}
+
+METABOLITE_ANALYTES = ('acetone', 'ammonia', 'isoprene', 'lactic acid')
+
+ScanArray = namedtuple('ScanArray', ['reagents', 'products', 'mean', 'std', 'min', 'max'])
+
+
+def filteredIonMask(reagents, products):
+    mask = np.zeros(len(reagents), dtype=bool)
+    for reagent, filteredProducts in FILTERED_IONS.items():
+        mask |= (reagents == reagent) & np.isin(products, filteredProducts)
+    return mask
+
+
+def skipLines(lines, count):
+    # Consume lines without handing them to the csv parser
+    deque(itertools.islice(lines, count), maxlen=0)
+
+
+def readScanRows(lines):
+    rows = []
+
+    for row in csv.reader(lines):
+        # Skip Incomplete  Files
+        if len(row) == 0 or row[0] == '':
+            logging.warning("File Incomplete")
+            return None
+        rows.append(row)
+
+    if len(rows) == 0:
+        logging.warning("File Incomplete")
+        return None
+
+    return rows
+
+
+def parseScanRows(rows):
+    row_len = rows[0].index(':')
+
+    block = np.array([row[:row_len] for row in rows], dtype=float)
+
+    reagents = block[:, 0].astype(np.int64)
+    products = block[:, 1].astype(np.int64)
+    intensities = block[:, 2:]
+
+    keep = ~filteredIonMask(reagents, products)
+    reagents, products, intensities = reagents[keep], products[keep], intensities[keep]
+
+    return ScanArray(
+        reagents,
+        products,
+        intensities.mean(axis=1),
+        intensities.std(axis=1),
+        intensities.min(axis=1),
+        intensities.max(axis=1),
+    )
+
+
+def parseScanBlockText(text):
+    # Just the SCAN_ROW_START..SCAN_ROW_END lines, e.g. decoded by scanBlockText on a read-ahead thread
+    rows = readScanRows(io.StringIO(text, newline=None))
+
+    if rows is None:
+        return None
+
+    addMetric("rowsParsed", len(rows))
+    return parseScanRows(rows)
+
+
+@contextmanager
+def mappedFile(fileName):
+    with open(fileName, 'rb') as f:
+        # Empty files can't be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def lineOffsets(mapped, lineCount=SCAN_ROW_END):
+    # Byte offset of the start of the first lineCount + 1 lines, fewer in a shorter file.
+    # Nothing past the end of the ion block is touched
+    offsets = [0]
+    newline = mapped.find(b'\n')
+    while newline >= 0 and len(offsets) <= lineCount:
+        offsets.append(newline + 1)
+        newline = mapped.find(b'\n', newline + 1)
+    return np.array(offsets, dtype=np.int64)
+
+
+def lineRange(mapped, offsets, start, end):
+    size = len(mapped)
+    startByte = offsets[start] if start < len(offsets) else size
+    endByte = offsets[end] if end < len(offsets) else size
+    return mapped[startByte:endByte]
+
+
+def lineRangeText(mapped, offsets, start, end):
+    # Decodes lines [start, end) without touching the rest of the file
+    data = lineRange(mapped, offsets, start, end)
+    addMetric("bytesRead", len(data))
+    return data.decode()
+
+
+def scanBlockText(mapped, offsets, start=SCAN_ROW_START, end=SCAN_ROW_END):
+    return lineRangeText(mapped, offsets, start, end)
+
+
+def isSummaryMarker(line):
+    return line.startswith('Summary') and next(csv.reader([line]))[0] == 'Summary'
+
+
+def readMetaboliteSummary(lines):
+    lines = iter(lines)
+
+    for line in lines:
+        if isSummaryMarker(line):
+            break
+    else:
+        logging.warning("File Incomplete")
+        return None
+
+    # Column headers sit between the marker and the concentrations
+    skipLines(lines, 2)
+
+    scanResults = dict.fromkeys(METABOLITE_ANALYTES)
+    remaining = len(scanResults)
+
+    for row in csv.reader(lines):
+        if len(row) < 2 or row[0] not in scanResults:
+            continue
+
+        if scanResults[row[0]] is None:
+            remaining -= 1
+        scanResults[row[0]] = float(row[1])
+
+        # Stop reading once every analyte has been found
+        if remaining == 0:
+            return scanResults
+
+    logging.warning("File Incomplete")
+    return None
+
+
+def readMetaboliteLines(lines):
+    scanResults = readMetaboliteSummary(lines)
+
+    if scanResults is not None:
+        addMetric("rowsParsed", len(scanResults))
+    return scanResults
+
+
+def parseMetaboliteText(text):
+    return readMetaboliteLines(io.StringIO(text, newline=None))
+
+
+def summaryStart(mapped):
+    # Offset of the first line that could be the Summary marker, -1 when there is none
+    if mapped[:len(b'Summary')] == b'Summary':
+        return 0
+
+    start = mapped.find(b'\nSummary')
+    return start if start < 0 else start + 1
+
+
+def summaryText(mapped):
+    # From the first line that could be the Summary marker to the end of the file
+    start = summaryStart(mapped)
+    if start < 0:
+        return ''
+
+    addMetric("bytesRead", len(mapped) - start)
+    return mapped[start:].decode()
+
+
+def scanBlockProblem(mapped, offsets, start=SCAN_ROW_START, end=SCAN_ROW_END):
+    # Cheap checks on the first and last block lines, the parser still checks every row
+    if len(mapped) == 0:
+        return "empty file"
+
+    lineCount = len(offsets) - 1 if offsets[-1] == len(mapped) else len(offsets)
+    if lineCount <= start:
+        return f"{lineCount} lines, the ion block starts at line {start + 1}"
+
+    for line in (start, min(end, lineCount) - 1):
+        # Counted in bytesRead when the block itself is decoded
+        row = next(csv.reader([lineRange(mapped, offsets, line, line + 1).decode()]), [])
+        if len(row) == 0 or row[0].strip() == '':
+            return f"no reagent on line {line + 1}"
+
+        if line == start and ':' not in row:
+            return f"no ':' column on line {line + 1}"
+
+    return None
+
+
+def summaryProblem(mapped):
+    start = summaryStart(mapped)
+    if start < 0:
+        return "no Summary section"
+
+    for analyte in METABOLITE_ANALYTES:
+        name = analyte.encode()
+        if mapped.find(b'\n' + name + b',', start) < 0 and mapped.find(b'\n"' + name + b'",', start) < 0:
+            return f"no {analyte} in the Summary section"
+
+    return None
+
+
+def scanArrayToDict(scan):
+    return {
+        (reagent, product): [mean] for reagent, product, mean in
+        zip(scan.reagents.tolist(), scan.products.tolist(), scan.mean.tolist())
+    }
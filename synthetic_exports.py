@@ -0,0 +1,112 @@
+import argparse
+import random
+from pathlib import Path
+
+from scan_parser import METABOLITE_ANALYTES, SCAN_ROW_END, SCAN_ROW_START
+
+# Reagent ions and the product mass range scanned for each, 386 products each fills the ion block
+REAGENT_PRODUCTS = {
+    19: range(10, 396),
+    30: range(10, 396),
+    32: range(10, 396),
+}
+
+SCAN_CYCLES = 5
+BASELINE_TIMES = [-7, -3]
+MASS_SCAN_TIMES = [0, 30]
+METABOLITE_TIMES = [-3, 30]
+ACQUISITION_DATE = "20181219-163117"
+
+
+def preambleLines(kind, clientFolder, minutes):
+    lines = [
+        "Instrument,Voice200ultra",
+        f"Method,{kind}",
+        f"Sample,{clientFolder} {minutes}min",
+        f"Acquired,{ACQUISITION_DATE}",
+    ]
+    lines.extend(f"Parameter {i},{i * 0.5:.1f}" for i in range(len(lines), SCAN_ROW_START))
+    return lines
+
+
+def writeScanExport(path, clientFolder, minutes, rng, incomplete=False, cycles=SCAN_CYCLES):
+    ions = [(reagent, product) for reagent, products in REAGENT_PRODUCTS.items() for product in products]
+    ions = ions[:SCAN_ROW_END - SCAN_ROW_START]
+
+    # An aborted acquisition leaves the rest of the block with empty rows
+    abortedAt = rng.randrange(len(ions)) if incomplete else len(ions)
+
+    with open(path, 'w') as f:
+        for line in preambleLines("Mass Scan", clientFolder, minutes):
+            f.write(line + "\n")
+
+        for i, (reagent, product) in enumerate(ions):
+            if i >= abortedAt:
+                f.write("," * (cycles + 3) + "\n")
+                continue
+
+            level = rng.lognormvariate(9, 2)
+            intensities = ",".join(f"{level * rng.uniform(0.8, 1.2):.2f}" for _ in range(cycles))
+            f.write(f"{reagent},{product},{intensities},:,{level:.2f}\n")
+
+        f.write("End of scan\n")
+
+
+def writeMetaboliteExport(path, clientFolder, minutes, rng, incomplete=False):
+    with open(path, 'w') as f:
+        for line in preambleLines("Metabolites", clientFolder, minutes)[:20]:
+            f.write(line + "\n")
+
+        # An interrupted export never gets its Summary section
+        if incomplete:
+            return
+
+        f.write("Summary\nAnalyte,Concentration\n,ppb\n")
+        for analyte in (*METABOLITE_ANALYTES, "ethanol"):
+            f.write(f"{analyte},{rng.uniform(1, 500):.3f}\n")
+
+
+def writeClientTree(rootDir, clientNumber, rng, incompleteRate=0.0):
+    clientFolder = f"AL-{clientNumber:02d}"
+    clientPath = Path(rootDir) / clientFolder
+
+    baselineFolder = clientPath / f"0-{clientFolder} Baseline"
+    massScanFolder = clientPath / f"2-{clientFolder} Mass Scans"
+    metaboliteFolder = clientPath / f"3-{clientFolder} Metabolites"
+    for folder in (baselineFolder, massScanFolder, metaboliteFolder):
+        folder.mkdir(parents=True, exist_ok=True)
+
+    for minutes in BASELINE_TIMES:
+        path = baselineFolder / f"1-baseline-{clientFolder} {minutes}min.csv"
+        writeScanExport(path, clientFolder, minutes, rng, rng.random() < incompleteRate)
+
+    for minutes in MASS_SCAN_TIMES:
+        path = massScanFolder / f"2-Mass-Scan-pos-neg-{clientFolder} {minutes}min-{ACQUISITION_DATE}.csv"
+        writeScanExport(path, clientFolder, minutes, rng, rng.random() < incompleteRate)
+
+    for minutes in METABOLITE_TIMES:
+        path = metaboliteFolder / f"3-Metab-{clientFolder} {minutes}min.csv"
+        writeMetaboliteExport(path, clientFolder, minutes, rng, rng.random() < incompleteRate)
+
+    return clientFolder
+
+
+def generateCohort(rootDir, clients, seed=0, incompleteRate=0.0):
+    rng = random.Random(seed)
+    Path(rootDir).mkdir(parents=True, exist_ok=True)
+    return [writeClientTree(rootDir, clientNumber, rng, incompleteRate) for clientNumber in range(1, clients + 1)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic cohort of SIFT-MS exports.")
+    parser.add_argument("root", help="folder to create the AL-* client folders in")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--incomplete", type=float, default=0.0, help="fraction of exports left incomplete")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    generateCohort(args.root, args.clients, args.seed, args.incomplete)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,21 @@
+import csv
+import json
 import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
 from unittest import TestCase
 
+import numpy as np
+
 from al_syft import findMassScansFileNames, processMassScans, processBaseline, findAllBaselinesinOutputFolder, \
-    readFileData, catenateFilesWithAverage, writeFileDatas
+    readFileData, catenateFilesWithAverage, writeFileDatas, isFresh, clientDataPath, loadClientData
 from al_syft import ROOT
 from al_syft import OUTPUT_FOLDER
+from al_syft import BASELINE_MATRIX_FILE, BASELINE_STATE_FILE, WatchedCohort, main, runClients, runCohortStages
+from baseline_aggregate import BaselineAggregator
+from run_metrics import takeMetrics
 
 
 class Test(TestCase):
@@ -34,3 +45,129 @@ class Test(TestCase):
         writeFileDatas(OUTPUT_FOLDER, "averageBaseline", newNames, newData)
 
         pass
+
+    def test_isFresh(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "source.csv"
+            output = Path(tmp) / "output.csv"
+            source.touch()
+            output.touch()
+            os.utime(source, ns=(1_000_000_000, 1_000_000_000))
+
+            self.assertTrue(isFresh([source, Path(tmp) / "removed.csv"], [output]))
+            self.assertFalse(isFresh([source], [output, Path(tmp) / "missing.pdf"]))
+
+            os.utime(source)
+            os.utime(output, ns=(1_000_000_000, 1_000_000_000))
+            self.assertFalse(isFresh([source], [output]))
+
+    def test_data_only_skips_reportlab(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            script = (
+                "import sys, al_syft\n"
+                f"al_syft.main(['--root', {tmp!r}, '--data-only', '--jobs', '1'])\n"
+                "sys.exit(any(name.startswith('reportlab') for name in sys.modules))\n"
+            )
+            subprocess.run([sys.executable, "-c", script], cwd=Path(__file__).parent, check=True)
+
+    def test_script_and_import_share_client_data(self):
+        # Data saved by `python al_syft.py` must load when al_syft is imported, and the other way round
+        with tempfile.TemporaryDirectory() as tmp:
+            from synthetic_exports import generateCohort
+            generateCohort(tmp, 1)
+
+            subprocess.run([sys.executable, "al_syft.py", "--root", tmp, "--data-only", "--jobs", "1"],
+                           cwd=Path(__file__).parent, check=True, capture_output=True)
+
+            self.assertEqual(loadClientData(Path(tmp) / "results", "AL-01").clientFolder, "AL-01")
+
+    def test_unreadable_client_data(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = clientDataPath(tmp, "AL-01")
+            path.parent.mkdir(parents=True)
+            path.write_bytes(b"not a pickle")
+
+            self.assertIsNone(loadClientData(tmp, "AL-01"))
+            self.assertFalse(path.exists())
+            self.assertIsNone(loadClientData(tmp, "AL-02"))
+
+    def test_watched_cohort_matches_a_full_run(self):
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as held:
+            from synthetic_exports import generateCohort
+            generateCohort(tmp, 3)
+            outputPath = Path(tmp) / "results"
+            os.rename(Path(tmp) / "AL-03", Path(held) / "AL-03")
+            main(['--root', tmp, '--data-only', '--jobs', '1'])
+
+            aggregator = BaselineAggregator(outputPath / BASELINE_STATE_FILE)
+            cohort = WatchedCohort(outputPath, aggregator)
+
+            def arrive(clientFolder, force=False):
+                (results, errors) = runClients([clientFolder], tmp, outputPath, workers=1, aggregator=aggregator,
+                                               clientReports=False, force=force)
+                self.assertEqual(errors, {})
+                cohort.update(results, dataOnly=True)
+
+            def outputs():
+                return {name: (outputPath / name).read_bytes()
+                        for name in ("baselineStatistics.csv", "scanDifferences.csv", BASELINE_MATRIX_FILE)}
+
+            def averageBaseline():
+                with open(outputPath / "averageBaseline.csv") as f:
+                    rows = list(csv.reader(f))
+                return rows[0], np.array([[float(value or "nan") for value in row] for row in rows[1:]])
+
+            # A new client is appended, a re-parsed one is updated in place
+            os.rename(Path(held) / "AL-03", Path(tmp) / "AL-03")
+            arrive("AL-03")
+            arrive("AL-02", force=True)
+            (watched, (watchedNames, watchedAverage)) = (outputs(), averageBaseline())
+
+            runCohortStages(outputPath, BaselineAggregator(Path(held) / "state.json"), force=True, dataOnly=True)
+            self.assertTrue(watched == outputs())
+
+            # Taking a client out of the running sums and adding it back moves the average by rounding only
+            (names, average) = averageBaseline()
+            self.assertEqual(watchedNames, names)
+            np.testing.assert_allclose(watchedAverage, average, rtol=1e-12)
+
+    def test_unknown_clients_are_rejected(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            from synthetic_exports import generateCohort
+            generateCohort(tmp, 1)
+
+            with self.assertRaises(SystemExit):
+                main(['--root', tmp, '--clients', 'AL-01', 'AL-99', '--data-only', '--jobs', '1'])
+            self.assertFalse((Path(tmp) / "results" / "clients").exists())
+
+    def test_unlistable_client_fails_on_its_own(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            from input_catalog import InputCatalog
+            from synthetic_exports import generateCohort
+            generateCohort(tmp, 1)
+
+            # AL-02 disappears between finding the client folders and listing them
+            catalog = InputCatalog.build(tmp, ["AL-01", "AL-02"])
+            (results, errors) = runClients(catalog.clients(), tmp, Path(tmp) / "results", workers=1, catalog=catalog,
+                                           clientReports=False)
+
+            self.assertEqual(list(results), ["AL-01"])
+            self.assertIsInstance(errors["AL-02"], FileNotFoundError)
+
+    def test_journaled_clients_are_not_listed(self):
+        with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as work:
+            from synthetic_exports import generateCohort
+            generateCohort(tmp, 2)
+
+            # Counters left by earlier runs in this process
+            takeMetrics()
+            for node in ("a", "b"):
+                main(['--root', tmp, '--data-only', '--jobs', '1', '--work-dir', work, '--node', node])
+
+            def scans(node):
+                (path,) = (Path(tmp) / "results" / "metrics").glob(f"run-*-{node}.json")
+                with open(path) as f:
+                    return json.load(f)["clients"].get("cohort", {}).get("scanClient", {}).get("calls", 0)
+
+            self.assertEqual(scans("a"), 2)
+            self.assertEqual(scans("b"), 0)
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from al_syft import processClientData
+from archive_tree import ArchiveCatalog, isArchive, physicalPath
+from input_catalog import InputCatalog
+from synthetic_exports import generateCohort
+
+
+def relativeFiles(clientFiles, base):
+    return (
+        sorted(os.path.relpath(path, base) for path in clientFiles.baseline),
+        sorted((os.path.relpath(path, base), time) for path, time in clientFiles.massScans),
+        sorted((os.path.relpath(path, base), time) for path, time in clientFiles.metabolites),
+    )
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name) / "cohort"
+        generateCohort(self.root, 3, seed=1, incompleteRate=0.2)
+
+        self.zipPath = shutil.make_archive(Path(self.tmp.name) / "cohort", "zip", self.root.parent, "cohort")
+        self.tarPath = shutil.make_archive(Path(self.tmp.name) / "cohort", "gztar", self.root.parent, "cohort")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_catalog_matches_folder(self):
+        catalog = InputCatalog.build(self.root)
+
+        for archivePath in (self.zipPath, self.tarPath):
+            self.assertTrue(isArchive(archivePath))
+            archiveCatalog = ArchiveCatalog.build(archivePath)
+
+            self.assertEqual(archiveCatalog.clients(), catalog.clients())
+            for clientFolder in catalog.clients():
+                self.assertEqual(
+                    relativeFiles(archiveCatalog.client(clientFolder), os.path.join(archivePath, "cohort")),
+                    relativeFiles(catalog.client(clientFolder), self.root),
+                )
+
+    def test_stream_reads_every_file_once(self):
+        for archivePath in (self.zipPath, self.tarPath):
+            catalog = ArchiveCatalog.build(archivePath, ["AL-01", "AL-03"])
+            streamed = list(catalog.stream(catalog.clients()))
+
+            self.assertEqual(sorted(clientFiles.client for clientFiles in streamed), ["AL-01", "AL-03"])
+            for clientFiles in streamed:
+                for path, data in clientFiles.members.items():
+                    self.assertEqual(physicalPath(path), archivePath)
+                    with open(self.root / os.path.relpath(path, os.path.join(archivePath, "cohort")), 'rb') as f:
+                        self.assertEqual(data, f.read())
+
+    def test_compressed_tar_is_streamed_once(self):
+        catalog = ArchiveCatalog.build(self.tarPath)
+        self.assertIsNone(catalog.archive)
+
+        stream = catalog.stream(catalog.clients())
+        streamed = [next(stream)]
+        # The rest come from the pass already under way, the archive isn't opened again
+        os.remove(self.tarPath)
+        streamed.extend(stream)
+
+        self.assertEqual(sorted(clientFiles.client for clientFiles in streamed), catalog.clients())
+        for clientFiles in streamed:
+            self.assertEqual(set(clientFiles.members), {*clientFiles.baseline, *[path for path, _ in clientFiles.massScans],
+                                                        *[path for path, _ in clientFiles.metabolites]})
+
+    def test_stream_skips_fresh_clients(self):
+        catalog = ArchiveCatalog.build(self.zipPath)
+        streamed = list(catalog.stream(catalog.clients(), needsData=lambda clientFiles: clientFiles.client == "AL-02"))
+
+        self.assertEqual({clientFiles.client: clientFiles.members is not None for clientFiles in streamed},
+                         {"AL-01": False, "AL-02": True, "AL-03": False})
+
+    def test_parse_from_archive(self):
+        catalog = InputCatalog.build(self.root)
+        archiveCatalog = ArchiveCatalog.build(self.tarPath)
+        outputPath = Path(self.tmp.name) / "results"
+
+        for clientFiles in archiveCatalog.stream(archiveCatalog.clients()):
+            # Folder listings come in directory order, the baseline columns follow it
+            clientFiles = clientFiles._replace(baseline=sorted(clientFiles.baseline))
+            folderFiles = catalog.client(clientFiles.client)
+            folderFiles = folderFiles._replace(baseline=sorted(folderFiles.baseline))
+
+            fromArchive = processClientData(clientFiles.client, self.tarPath, outputPath, clientFiles)
+            fromFolder = processClientData(clientFiles.client, self.root, outputPath, folderFiles)
+
+            self.assertEqual(fromArchive.baseline, fromFolder.baseline)
+            self.assertEqual(fromArchive.massScans, fromFolder.massScans)
+            self.assertEqual(fromArchive.metabolites, fromFolder.metabolites)
@@ -0,0 +1,39 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from baseline_aggregate import BaselineAggregator
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.statePath = Path(self.tmp.name) / "state.json"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_average_and_replace(self):
+        aggregator = BaselineAggregator(self.statePath)
+        aggregator.add("AL-01-baseline", {(19, 20): [1.0, 1.0], (30, 31): [4.0, 4.0]})
+        aggregator.add("AL-02-baseline", {(19, 20): [3.0, 3.0]})
+        aggregator.add("AL-03-baseline", {})
+
+        self.assertEqual(aggregator.average(), {(19, 20): 2.0, (30, 31): 4.0})
+
+        aggregator.add("AL-02-baseline", {(19, 20): [5.0, 5.0]})
+
+        self.assertEqual(aggregator.catenated(), (
+            ["Average Intensity", "AL-01-baseline", "AL-02-baseline"],
+            {(19, 20): [3.0, 1.0, 5.0], (30, 31): [4.0, 4.0, '']},
+        ))
+
+    def test_persisted_state(self):
+        aggregator = BaselineAggregator(self.statePath)
+        aggregator.add("AL-01-baseline", {(19, 20): [1.0]})
+        aggregator.save()
+
+        reloaded = BaselineAggregator(self.statePath)
+        reloaded.add("AL-02-baseline", {(19, 20): [3.0]})
+
+        self.assertEqual(reloaded.average(), {(19, 20): 2.0})
@@ -0,0 +1,105 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import TestCase
+
+from batch_coordinator import COHORT, BatchCoordinator
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.workDir = Path(self.tmp.name)
+        self.first = BatchCoordinator(self.workDir, "first", leaseSeconds=60)
+        self.second = BatchCoordinator(self.workDir, "second", leaseSeconds=60)
+
+    def tearDown(self):
+        self.first.close()
+        self.second.close()
+        self.tmp.cleanup()
+
+    def test_claims_are_exclusive(self):
+        self.assertTrue(self.first.claim("AL-01"))
+        self.assertFalse(self.second.claim("AL-01"))
+        self.assertTrue(self.second.claim("AL-02"))
+
+        # A failure frees the client for another node
+        self.first.fail("AL-01")
+        self.assertTrue(self.second.claim("AL-01"))
+
+    def test_journal_skips_done_clients(self):
+        self.assertTrue(self.first.claim("AL-01"))
+        self.first.complete("AL-01")
+
+        self.assertFalse(self.second.claim("AL-01"))
+        self.assertEqual(self.second.pending(["AL-01", "AL-02"]), ["AL-02"])
+
+        # A restarted node reads every journal
+        with BatchCoordinator(self.workDir, "restarted") as restarted:
+            self.assertEqual(restarted.pending(["AL-01", "AL-02"]), ["AL-02"])
+
+    def test_partial_journal_line(self):
+        with open(self.workDir / "journal-third.jsonl", 'w') as f:
+            f.write(json.dumps({"name": "AL-01", "status": "done"}) + "\n" + '{"name": "AL-02", "sta')
+
+        self.assertEqual(self.first.pending(["AL-01", "AL-02"]), ["AL-02"])
+
+        with open(self.workDir / "journal-third.jsonl", 'a') as f:
+            f.write('tus": "done"}\n')
+
+        self.assertEqual(self.first.pending(["AL-01", "AL-02"]), [])
+
+    def test_expired_lease_is_taken_over(self):
+        self.assertTrue(self.first.claim("AL-01"))
+
+        stale = time.time() - 120
+        os.utime(self.first.leasePath("AL-01"), (stale, stale))
+
+        self.assertTrue(self.second.claim("AL-01"))
+        self.assertEqual(self.second.leaseOwner(self.second.leasePath("AL-01")), "second")
+
+        # The old owner doesn't remove a lease it no longer holds
+        self.first.release("AL-01")
+        self.assertTrue(self.second.leasePath("AL-01").exists())
+
+    def test_dead_process_lease_is_taken_over(self):
+        code = f"from batch_coordinator import BatchCoordinator; BatchCoordinator({str(self.workDir)!r}, 'dead').claim('AL-01')"
+        subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent, check=True)
+
+        self.assertEqual(self.first.leaseOwner(self.first.leasePath("AL-01")), "dead")
+        self.assertTrue(self.first.claim("AL-01"))
+
+    def test_cohort_waits_for_every_client(self):
+        self.assertTrue(self.first.claim("AL-01"))
+        self.assertFalse(self.second.claimCohort(["AL-01"]))
+
+        self.first.complete("AL-01")
+        self.assertTrue(self.second.claimCohort(["AL-01"]))
+        self.assertFalse(self.first.claimCohort(["AL-01"]))
+
+        self.second.complete(COHORT)
+        self.assertIn(COHORT, self.first.refresh())
+
+    def test_failed_clients_settle_the_cohort(self):
+        self.assertTrue(self.first.claim("AL-01"))
+        self.first.complete("AL-01")
+        self.assertTrue(self.first.claim("AL-02"))
+        self.first.fail("AL-02")
+
+        # Being retried by another node, the cohort waits for it
+        self.assertTrue(self.second.claim("AL-02"))
+        self.assertFalse(self.first.claimCohort(["AL-01", "AL-02"]))
+        self.second.fail("AL-02")
+
+        self.assertEqual(self.first.failedClients(["AL-01", "AL-02"]), ["AL-02"])
+        self.assertTrue(self.first.claimCohort(["AL-01", "AL-02"]))
+        self.first.complete(COHORT, failed=["AL-02"])
+
+        # Failed clients are still handed to the next run, a later success clears them
+        self.assertEqual(self.second.pending(["AL-01", "AL-02"]), ["AL-02"])
+        self.second.journal("AL-02", "done")
+        self.assertEqual(self.first.failedClients(["AL-01", "AL-02"]), [])
@@ -0,0 +1,22 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from benchmark import benchmarkCohort
+from synthetic_exports import generateCohort
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_benchmark_cohort(self):
+        generateCohort(self.root / "root", 1)
+        results = benchmarkCohort(self.root / "root", self.root / "results", renderLimit=0)
+
+        self.assertEqual(results["process_file"]["calls"], 5)
+        self.assertNotIn("renderClientPDF", results)
@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+import numpy as np
+
+from chart_data import chartSeries, lttbIndices, scanSeries
+from ion_scan import IonScan
+
+
+class Test(TestCase):
+    def test_series(self):
+        scanData = {(30, 31): [2.0, 9.0], (19, 20): [1.0], (30, 151): [3.0], (19, 150): [4.0], (32, 200): [5.0]}
+
+        series = scanSeries(scanData)
+
+        self.assertEqual(list(series), [30, 19, 32])
+        self.assertEqual(series, {30: [(31, 2.0)], 19: [(20, 1.0), (150, 4.0)], 32: []})
+        self.assertEqual(scanSeries(IonScan.fromDict(scanData)), series)
+
+    def test_lttb_keeps_peaks(self):
+        x = np.arange(1000)
+        y = np.sin(x / 30.0)
+        y[500] = 10.0
+
+        indices = lttbIndices(x, y, 50)
+
+        self.assertEqual(len(indices), 50)
+        self.assertEqual((indices[0], indices[-1]), (0, 999))
+        self.assertIn(500, indices)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_point_budget(self):
+        products = np.arange(10, 150)
+        series = chartSeries(np.full(len(products), 19), products, products * 2.0, pointBudget=20)
+
+        self.assertEqual(len(series[19]), 20)
+        self.assertEqual(series[19][0], (10, 20.0))
+        self.assertEqual(len(chartSeries([19, 19], [10, 11], [1.0, 2.0], pointBudget=20)[19]), 2)
@@ -0,0 +1,32 @@
+import math
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from client_tensor import ClientTensor
+
+
+class Test(TestCase):
+    def setUp(self):
+        metabolite = {'acetone': 1.0, 'ammonia': 2.0, 'isoprene': 3.0, 'lactic acid': 4.0}
+        self.tensor = ClientTensor.fromScans(
+            {(19, 20): [1.0, 1.0]},
+            {30: {(19, 20): [3.0], (30, 31): [5.0]}, 0: {(19, 20): [2.0]}},
+            {30: metabolite, -3: dict(metabolite, acetone=0.5)},
+        )
+
+    def test_slices(self):
+        self.assertEqual(self.tensor.times.tolist(), [0, 30])
+        self.assertEqual(self.tensor.trajectory(19, 20)[1].tolist(), [2.0, 3.0])
+        self.assertEqual(self.tensor.timepointData(0), {(19, 20): [2.0]})
+        self.assertTrue(math.isnan(self.tensor.baseline[1]))
+        self.assertEqual(self.tensor.metaboliteTrajectory('acetone')[1].tolist(), [0.5, 1.0])
+
+    def test_lazy_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.tensor.save(Path(tmp) / "AL-01.npz")
+            loaded = ClientTensor.load(Path(tmp) / "AL-01.npz")
+
+            self.assertEqual(loaded.timepointData(30), {(19, 20): [3.0], (30, 31): [5.0]})
+            self.assertEqual(loaded.metaboliteTimes.tolist(), [-3, 30])
+            loaded.close()
@@ -0,0 +1,37 @@
+import math
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from cohort_matrix import CohortMatrix
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.matrix = CohortMatrix.fromClientValues({
+            "AL-02-baseline": {(19, 20): 3.0},
+            "AL-01-baseline": {(19, 20): 1.0, (30, 31): 4.0},
+            "AL-03-baseline": {(19, 20): 8.0},
+        })
+
+    def test_statistics(self):
+        self.assertEqual(self.matrix.clients, ["AL-01-baseline", "AL-02-baseline", "AL-03-baseline"])
+        self.assertEqual(self.matrix.column(19, 20).tolist(), [1.0, 3.0, 8.0])
+        self.assertTrue(math.isnan(self.matrix.client("AL-02-baseline")[1]))
+
+        statistics = self.matrix.statistics()
+        self.assertEqual(statistics["Mean"].tolist(), [4.0, 4.0])
+        self.assertEqual(statistics["Median"].tolist(), [3.0, 4.0])
+        np.testing.assert_allclose(statistics["Coverage"], [1.0, 1 / 3])
+
+    def test_save_and_mmap(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.matrix.save(Path(tmp) / "baselineMatrix.npy")
+            loaded = CohortMatrix.load(Path(tmp) / "baselineMatrix.npy")
+
+            self.assertIsInstance(loaded.values, np.memmap)
+            self.assertEqual(loaded.clients, self.matrix.clients)
+            self.assertEqual(loaded.median().tolist(), [3.0, 4.0])
+            del loaded
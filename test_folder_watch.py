@@ -0,0 +1,83 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from folder_watch import FolderWatch
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.baselineFolder = self.root / "AL-01" / "0-AL-01 Baseline"
+        self.baselineFolder.mkdir(parents=True)
+        self.write(self.baselineFolder / "1-baseline-AL-01 -7min.csv", "old")
+
+        self.clock = Clock()
+        self.watch = FolderWatch(self.root, settleSeconds=10, clock=self.clock)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, text, mode='w'):
+        with open(path, mode) as f:
+            f.write(text)
+        # Folder and file mtimes move visibly even on coarse clocks
+        self.bump(path)
+
+    def bump(self, path):
+        for current in (Path(path), Path(path).parent):
+            stat = os.stat(current)
+            os.utime(current, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def pollAt(self, now):
+        self.clock.now = now
+        return self.watch.poll()
+
+    def test_existing_files_are_seen(self):
+        self.assertEqual(self.pollAt(100), set())
+
+    def test_waits_for_writes_to_settle(self):
+        path = self.baselineFolder / "1-baseline-AL-01 -3min.csv"
+        self.write(path, "first half")
+        self.assertEqual(self.pollAt(1), set())
+
+        # Appending doesn't move the folder's mtime, the file itself is watched
+        self.write(path, "second half", 'a')
+        self.assertEqual(self.pollAt(8), set())
+        self.assertEqual(self.pollAt(15), set())
+        self.assertEqual(self.pollAt(19), {"AL-01"})
+        self.assertEqual(self.pollAt(40), set())
+
+    def test_new_client_folder(self):
+        folder = self.root / "AL-02" / "2-AL-02 Mass Scans"
+        folder.mkdir(parents=True)
+        self.write(folder / "2-Mass-Scan-pos-neg-AL-02 30min-1.csv", "scan")
+        self.bump(folder)
+        self.bump(self.root / "AL-02")
+
+        self.assertEqual(self.pollAt(1), set())
+        self.assertEqual(self.pollAt(12), {"AL-02"})
+
+    def test_removed_export(self):
+        (self.baselineFolder / "1-baseline-AL-01 -7min.csv").unlink()
+        self.bump(self.baselineFolder)
+
+        self.assertEqual(self.pollAt(1), set())
+        self.assertEqual(self.pollAt(12), {"AL-01"})
+
+    def test_other_folders_are_ignored(self):
+        (self.root / "results").mkdir()
+        self.write(self.root / "results" / "AL-01-baseline.csv", "output")
+
+        self.assertEqual(self.pollAt(1), set())
+        self.assertEqual(self.pollAt(20), set())
@@ -0,0 +1,62 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from input_catalog import InputCatalog
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'w').close()
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+        touch(self.root / "AL-01/0-Baseline Data/1-AL-01 -7min.csv")
+        touch(self.root / "AL-01/2-AL-1 Mass Scans/2-Mass-Scan-pos-neg-AL-01 0min-1.csv")
+        touch(self.root / "AL-01/2-AL-1 Mass Scans/2-Mass-Scan-pos-neg-AL-01 30min-1.csv")
+        touch(self.root / "AL-01/3-AL-1 Metabolites/3-AL-01 -3min.csv")
+        touch(self.root / "AL-01/3-AL-1 Metabolites/notes.txt")
+        touch(self.root / "AL-02/2-AL-2 Mass Scans/2-Mass-Scan-pos-neg-AL-02 15min-1.csv")
+        touch(self.root / "AL-notes.txt")
+        touch(self.root / "results/AL-01-baseline.csv")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_catalog(self):
+        catalog = InputCatalog.build(self.root)
+
+        self.assertEqual(catalog.clients(), ["AL-01", "AL-02"])
+
+        client = catalog.client("AL-01")
+        self.assertEqual(sorted(Path(path).name for path in client.baseline), [
+            "1-AL-01 -7min.csv",
+            "2-Mass-Scan-pos-neg-AL-01 0min-1.csv",
+        ])
+        self.assertEqual(sorted(minutes for _, minutes in client.massScans), [0, 30])
+        self.assertEqual([minutes for _, minutes in client.metabolites], [-3])
+        self.assertEqual([minutes for _, minutes in catalog.client("AL-02").massScans], [15])
+
+    def test_metabolites_only_in_their_folder(self):
+        # "3.* ...min" also matches every export of a client whose number holds a 3
+        touch(self.root / "AL-13/0-AL-13 Baseline/1-baseline-AL-13 -3min.csv")
+        touch(self.root / "AL-13/2-AL-13 Mass Scans/2-Mass-Scan-pos-neg-AL-13 30min-1.csv")
+        touch(self.root / "AL-13/3-AL-13 Metabolites/3-Metab-AL-13 30min.csv")
+
+        client = InputCatalog.build(self.root, ["AL-13"]).client("AL-13")
+
+        self.assertEqual([Path(path).name for path, _ in client.metabolites], ["3-Metab-AL-13 30min.csv"])
+        self.assertEqual(len(client.baseline), 1)
+        self.assertEqual([minutes for _, minutes in client.massScans], [30])
+
+    def test_folder_errors_are_kept_per_client(self):
+        catalog = InputCatalog.build(self.root, ["AL-01", "AL-04"])
+
+        self.assertEqual(catalog.clients(), ["AL-01", "AL-04"])
+        self.assertEqual(list(catalog.clientFiles), ["AL-01"])
+        self.assertIsInstance(catalog.errors["AL-04"], FileNotFoundError)
@@ -0,0 +1,41 @@
+import pickle
+from unittest import TestCase
+
+from ion_scan import IonScan
+
+
+class Test(TestCase):
+    def test_reads_like_a_dict(self):
+        scan = IonScan.fromArrays([30, 19], [31, 20], [2.0, 1.0])
+
+        self.assertEqual(list(scan.items()), [((30, 31), [2.0]), ((19, 20), [1.0])])
+        self.assertEqual(scan[(19, 20)], [1.0])
+        self.assertIn((30, 31), scan)
+        self.assertNotIn((30, 99), scan)
+        self.assertNotIn("x", scan)
+        self.assertEqual(scan.get((1, 2)), None)
+        self.assertEqual(scan, {(19, 20): [1.0], (30, 31): [2.0]})
+
+        with self.assertRaises(KeyError):
+            scan[(32, 33)]
+
+    def test_views_like_a_dict(self):
+        scan = IonScan.fromArrays([30, 19], [31, 20], [2.0, 1.0])
+
+        for view in (scan.keys(), scan.values(), scan.items()):
+            self.assertEqual(len(view), 2)
+            self.assertEqual(list(view), list(view))
+        self.assertIn([1.0], scan.values())
+        self.assertIn(((30, 31), [2.0]), scan.items())
+
+    def test_shared_index(self):
+        first = IonScan.fromArrays([19, 19], [20, 21], [1.0, 2.0])
+        second = IonScan.fromDict({(19, 21): [3.0], (19, 22): [4.0]})
+
+        self.assertEqual(first.slots[1], second.slots[0])
+        self.assertEqual(first[(19, 21)], [2.0])
+        self.assertEqual(second[(19, 22)], [4.0])
+
+    def test_pickle(self):
+        scan = IonScan.fromArrays([19, 30], [20, 31], [1.0, 2.0])
+        self.assertEqual(pickle.loads(pickle.dumps(scan)), scan)
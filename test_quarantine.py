@@ -0,0 +1,46 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from quarantine import Quarantine, quarantinedFiles
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name) / "quarantine"
+        self.path = os.path.join(self.tmp.name, "scan.csv")
+        with open(self.path, 'w') as f:
+            f.write("broken\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_skipped_until_changed(self):
+        quarantine = Quarantine(self.folder / "AL-01.json")
+        quarantine.add(self.path, 'metabolite', "no Summary section")
+
+        reloaded = Quarantine(self.folder / "AL-01.json")
+        self.assertEqual(reloaded.reason(self.path, 'metabolite'), "no Summary section")
+        self.assertIsNone(reloaded.reason(self.path, 'scan'))
+        self.assertEqual(quarantinedFiles(self.folder), {
+            ('metabolite', self.path): reloaded.entries['metabolite'][self.path],
+        })
+
+        with open(self.path, 'a') as f:
+            f.write("more\n")
+
+        self.assertIsNone(reloaded.reason(self.path, 'metabolite'))
+        self.assertFalse((self.folder / "AL-01.json").exists())
+
+    def test_retain_drops_files_no_longer_of_that_kind(self):
+        quarantine = Quarantine(self.folder / "AL-13.json")
+        quarantine.add(self.path, 'metabolite', "no Summary section")
+        quarantine.add(self.path, 'scan', "empty file")
+
+        quarantine.retain({'scan': [Path(self.path)], 'metabolite': []})
+
+        reloaded = Quarantine(self.folder / "AL-13.json")
+        self.assertIsNone(reloaded.reason(self.path, 'metabolite'))
+        self.assertEqual(reloaded.reason(self.path, 'scan'), "empty file")
@@ -0,0 +1,36 @@
+import threading
+from unittest import TestCase
+
+from read_ahead import readAhead
+
+
+class Test(TestCase):
+    def test_order_and_values(self):
+        self.assertEqual(list(readAhead(range(10), lambda item: item * 2, depth=2)), [(i, i * 2) for i in range(10)])
+
+    def test_backpressure(self):
+        fetched = []
+        gate = threading.Event()
+
+        def fetch(item):
+            fetched.append(item)
+            return item
+
+        items = readAhead(range(100), fetch, depth=3)
+        next(items)
+        gate.wait(0.3)
+
+        # One handed out, three queued, one blocked on the full queue
+        self.assertLessEqual(len(fetched), 5)
+        items.close()
+
+    def test_errors_reach_consumer(self):
+        def fetch(item):
+            if item == 2:
+                raise ValueError(item)
+            return item
+
+        items = readAhead(range(5), fetch)
+        self.assertEqual([next(items), next(items)], [(0, 0), (1, 1)])
+        with self.assertRaises(ValueError):
+            next(items)
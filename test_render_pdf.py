@@ -1,9 +1,26 @@
+import tempfile
 from pathlib import Path
 from unittest import TestCase
-from render_pdf import renderClientPDF
+from render_pdf import renderClientPDF, renderCohortReport
 
 
 class Test(TestCase):
     def test_render_pdf(self):
         renderClientPDF(Path("/Users/school/Downloads/Chem-H Metabolite data and Mass Scans/results/AL-07-baseline.csv"),
                    Path("/Users/school/Downloads/Chem-H Metabolite data and Mass Scans/results/AL-07-30min.csv"))
+
+    def test_render_cohort_report(self):
+        baseline = {(19, product): [float(product)] for product in range(10, 160)}
+        scan30 = {(19, product): [float(product) * 2] for product in range(10, 160)}
+        metabolites = {'acetone': 1.0, 'ammonia': 2.0}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            outputFile = renderCohortReport(Path(tmp) / "cohort.pdf", [
+                ("AL-01", baseline, scan30, metabolites, metabolites),
+                ("AL-02", {}, {}, None, None),
+            ], baseline)
+
+            content = outputFile.read_bytes()
+
+        self.assertEqual(content.count(b'/Type /Page\n'), 3)
+        self.assertEqual(content.count(b'/FontFile2'), 1)
@@ -0,0 +1,69 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from ion_scan import IonScan
+from results_warehouse import ResultsWarehouse
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.warehouse = ResultsWarehouse(Path(self.tmp.name) / "results.sqlite")
+
+        self.warehouse.storeClient(
+            "AL-01", 1,
+            {(19, 37): [2.0, 1.0, 3.0], (30, 31): [5.0, 5.0, 5.0]},
+            {"30min": IonScan.fromArrays([19], [37], [4.0])},
+            {"baseline": {"acetone": 1.5, "isoprene": 2.5}},
+        )
+        self.warehouse.storeClient(
+            "AL-02", 2,
+            {(19, 37): [6.0, 6.0]},
+            {},
+            {"baseline": {"acetone": 3.5, "isoprene": 0.5}},
+        )
+
+    def tearDown(self):
+        self.warehouse.close()
+        self.tmp.cleanup()
+
+    def test_cohort_queries(self):
+        self.assertEqual(self.warehouse.clients(), ["AL-01", "AL-02"])
+        self.assertEqual(self.warehouse.ion(19, 37), {"AL-01": 2.0, "AL-02": 6.0})
+        self.assertEqual(self.warehouse.ion(19, 37, "30min"), {"AL-01": 4.0})
+        self.assertEqual(self.warehouse.metabolite("acetone"), {"AL-01": 1.5, "AL-02": 3.5})
+
+        self.assertEqual(self.warehouse.clientIons("AL-01"), {(19, 37): [2.0], (30, 31): [5.0]})
+        self.assertEqual(self.warehouse.timepoint("baseline"), {
+            "AL-01": {(19, 37): [2.0], (30, 31): [5.0]},
+            "AL-02": {(19, 37): [6.0]},
+        })
+
+    def test_store_replaces_client(self):
+        self.warehouse.storeClient("AL-01", 3, {(19, 37): [7.0]}, {}, {})
+
+        self.assertEqual(self.warehouse.parsed("AL-01"), 3)
+        self.assertEqual(self.warehouse.clientIons("AL-01"), {(19, 37): [7.0]})
+        self.assertEqual(self.warehouse.ion(19, 37, "30min"), {})
+        self.assertEqual(self.warehouse.metabolite("acetone"), {"AL-02": 3.5})
+
+    def test_retain(self):
+        self.warehouse.retain(["AL-02"])
+
+        self.assertEqual(self.warehouse.clients(), ["AL-02"])
+        self.assertEqual(self.warehouse.parsed("AL-01"), None)
+        self.assertEqual(self.warehouse.ion(19, 37), {"AL-02": 6.0})
+
+    def test_wal_mode(self):
+        self.assertEqual(self.warehouse.connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_shared_warehouse_has_no_wal(self):
+        with ResultsWarehouse(Path(self.tmp.name) / "shared.sqlite", shared=True) as shared:
+            self.assertEqual(shared.connection.execute("PRAGMA journal_mode").fetchone()[0], "delete")
+
+        # A file first opened by a single-node run goes back to a rollback journal
+        self.warehouse.close()
+        with ResultsWarehouse(self.warehouse.path, shared=True) as shared:
+            self.assertEqual(shared.connection.execute("PRAGMA journal_mode").fetchone()[0], "delete")
+            self.assertEqual(shared.clients(), ["AL-01", "AL-02"])
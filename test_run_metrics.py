@@ -0,0 +1,64 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from run_metrics import RunMetrics, addMetric, measured, takeMetrics, timed
+
+
+@timed("inner")
+def inner():
+    addMetric("rowsParsed", 10)
+    addMetric("incompleteFiles")
+
+
+def outer(path):
+    inner()
+    inner()
+    addMetric("bytesRead", 5)
+    return path
+
+
+class Test(TestCase):
+    def setUp(self):
+        takeMetrics()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.outputPath = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_measured_counts_per_client_and_stage(self):
+        (result, clientMetrics) = measured(outer, "AL-01", None, "a.csv")
+
+        self.assertEqual(result, "a.csv")
+        self.assertEqual(clientMetrics["AL-01"]["inner"]["calls"], 2)
+        self.assertEqual(clientMetrics["AL-01"]["inner"]["rowsParsed"], 20)
+        self.assertEqual(clientMetrics["AL-01"]["inner"]["incompleteFiles"], 2)
+        self.assertEqual(clientMetrics["AL-01"]["outer"]["bytesRead"], 5)
+        self.assertEqual(takeMetrics(), {})
+
+    def test_profile_and_metrics_file(self):
+        profilePath = self.outputPath / "metrics" / "AL-01-parse.prof"
+        metrics = RunMetrics()
+        metrics.merge(measured(outer, "AL-01", profilePath, "a.csv")[1])
+        metrics.merge(measured(outer, "AL-02", None, "b.csv")[1])
+
+        self.assertTrue(profilePath.is_file())
+
+        with open(metrics.write(self.outputPath / "metrics")) as f:
+            written = json.load(f)
+
+        self.assertEqual(sorted(written["clients"]), ["AL-01", "AL-02"])
+        self.assertEqual(written["stages"]["inner"]["calls"], 4)
+        self.assertEqual(written["stages"]["outer"]["bytesRead"], 10)
+
+    def test_runs_started_together_keep_their_files(self):
+        first = RunMetrics()
+        second = RunMetrics()
+        second.started = first.started
+
+        paths = {first.write(self.outputPath), second.write(self.outputPath), first.write(self.outputPath)}
+
+        self.assertEqual(len(paths), 3)
+        self.assertTrue(all(path.is_file() for path in paths))
@@ -0,0 +1,74 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from al_syft import fetchScanFile, process_file
+from scan_cache import ScanCache
+from test_scan_parser import writeScanFile
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "scan.csv")
+        self.cache = ScanCache(Path(self.tmp.name) / "cache")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cached_scan(self):
+        writeScanFile(self.path, [[19, 20, 1.0, 3.0, ':', 'x']])
+
+        self.assertFalse(fetchScanFile(self.path, 'scan', self.cache).cached)
+        self.assertEqual(dict(process_file(self.path, self.cache)), {(19, 20): [2.0]})
+
+        fetched = fetchScanFile(self.path, 'scan', ScanCache(self.cache.cacheDir))
+        self.assertTrue(fetched.cached)
+        self.assertEqual(fetched.value.mean.tolist(), [2.0])
+        self.assertEqual(fetched.value.reagents.tolist(), [19])
+
+        writeScanFile(self.path, [[19, 20, 5.0, 7.0, ':', 'x']])
+        self.assertFalse(fetchScanFile(self.path, 'scan', self.cache).cached)
+        self.assertEqual(dict(process_file(self.path, self.cache)), {(19, 20): [6.0]})
+
+    def test_cached_incomplete_scan(self):
+        # Passes the first and last line checks, the parser finds the gap
+        writeScanFile(self.path, [[19, 20, 1.0, ':', 'x'], ['', '', ':'], [30, 31, 2.0, ':', 'x']])
+
+        self.assertIsNone(process_file(self.path, self.cache))
+        fetched = fetchScanFile(self.path, 'scan', self.cache)
+        self.assertTrue(fetched.cached)
+        self.assertIsNone(fetched.value)
+
+    def test_eviction_and_invalidation(self):
+        cache = ScanCache(self.cache.cacheDir, maxBytes=1)
+        writeScanFile(self.path, [[19, 20, 1.0, 3.0, ':', 'x']])
+        process_file(self.path, cache)
+        self.assertEqual(cache.entries(), [])
+
+        stale = self.cache.cacheDir / "stale-fingerprint"
+        stale.mkdir(parents=True)
+        self.cache.invalidate()
+        self.assertFalse(stale.exists())
+
+    def test_shared_cache_keeps_to_its_limit(self):
+        # Two processes' caches over one folder, each sees what the other wrote
+        maxBytes = 40 * 1024
+        caches = [ScanCache(self.cache.cacheDir, maxBytes), ScanCache(self.cache.cacheDir, maxBytes)]
+
+        for i in range(60):
+            path = os.path.join(self.tmp.name, f"scan-{i}.csv")
+            writeScanFile(path, [[19, 20, float(i), 3.0, ':', 'x'], [30, 31, 2.0, 4.0, ':', 'x']])
+            process_file(path, caches[i % 2])
+
+            entries = caches[0].entries()
+            self.assertLessEqual(sum(size for _, size, _ in entries), maxBytes)
+
+        # Refs only lead to entries still in the cache
+        kept = {os.path.basename(path).split('.')[0].split('-')[-1] for path, _, _ in entries}
+        refs = list(caches[0].refsDir.iterdir())
+        self.assertGreater(len(refs), 0)
+        self.assertLess(len(refs), 60)
+        for ref in refs:
+            self.assertIn(ref.read_text(), kept)
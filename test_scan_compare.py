@@ -0,0 +1,33 @@
+import math
+from unittest import TestCase
+
+from scan_compare import compareScans, compareTimepoints, comparisonToDict, cohortDeltaTable
+
+
+class Test(TestCase):
+    def test_compare_scans_by_key(self):
+        baseline = {(19, 20): [2.0, 1.0, 3.0], (19, 21): [4.0], (30, 31): [0.0]}
+        scan30 = {(30, 31): [5.0], (19, 21): [8.0], (32, 33): [1.0]}
+
+        comparison = compareScans(baseline, scan30)
+
+        self.assertEqual(comparison.reagents.tolist(), [19, 30])
+        self.assertEqual(comparison.products.tolist(), [21, 31])
+        self.assertEqual(comparison.delta.tolist(), [4.0, 5.0])
+        self.assertEqual(comparison.ratio[0], 2.0)
+        self.assertEqual(comparison.foldChange[0], 1.0)
+        self.assertTrue(math.isnan(comparison.ratio[1]))
+        self.assertEqual(comparisonToDict(comparison), {(19, 21): [4.0], (30, 31): [5.0]})
+
+    def test_cohort_delta_table(self):
+        comparisons = {
+            "AL-02": compareTimepoints({(19, 20): [1.0]}, {30: {(19, 20): [3.0]}}),
+            "AL-01": compareTimepoints({(19, 20): [1.0]}, {0: {(19, 20): [1.0]}, 30: {(19, 20): [2.0]}}),
+            "AL-03": compareTimepoints({}, {30: {(19, 20): [2.0]}}),
+        }
+
+        (clients, times, table) = cohortDeltaTable(comparisons)
+
+        self.assertEqual(clients, ["AL-01", "AL-01", "AL-02"])
+        self.assertEqual(times, [0, 30, 30])
+        self.assertEqual(table.delta.tolist(), [0.0, 1.0, 2.0])
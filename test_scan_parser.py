@@ -0,0 +1,151 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from scan_parser import (scanArrayToDict, readMetaboliteSummary, SCAN_ROW_START, lineOffsets, mappedFile, parseMetaboliteText,
+                         parseScanBlockText, scanBlockProblem, scanBlockText, summaryProblem, summaryText)
+
+
+def writeScanFile(path, rows, preamble=SCAN_ROW_START):
+    with open(path, 'w') as f:
+        for i in range(preamble):
+            f.write(f"Preamble line {i},value\n")
+        for row in rows:
+            f.write(",".join(str(value) for value in row) + "\n")
+
+
+def parseScanFile(path):
+    # How fetchScanFile and process_file read a scan: only the ion block is decoded and parsed
+    with mappedFile(path) as mapped:
+        return parseScanBlockText(scanBlockText(mapped, lineOffsets(mapped)))
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "scan.csv")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_read_scan_array(self):
+        writeScanFile(self.path, [
+            [19, 20, 1.0, 3.0, ':', 'x'],
+            [19, 37, 5.0, 5.0, ':', 'x'],
+            [30, 31, 2.0, 4.0, ':', 'x'],
+        ])
+
+        scan = parseScanFile(self.path)
+
+        self.assertEqual(scan.reagents.tolist(), [19, 30])
+        self.assertEqual(scan.products.tolist(), [20, 31])
+        self.assertEqual(scan.mean.tolist(), [2.0, 3.0])
+        self.assertEqual(scan.std.tolist(), [1.0, 1.0])
+        self.assertEqual(scan.min.tolist(), [1.0, 2.0])
+        self.assertEqual(scan.max.tolist(), [3.0, 4.0])
+        self.assertEqual(scanArrayToDict(scan), {(19, 20): [2.0], (30, 31): [3.0]})
+
+    def test_incomplete_scan(self):
+        writeScanFile(self.path, [
+            [19, 20, 1.0, 3.0, ':', 'x'],
+            ['', '', '', '', ':', 'x'],
+        ])
+
+        self.assertIsNone(parseScanFile(self.path))
+
+    def test_read_metabolite_summary(self):
+        lines = [
+            "Header,1\n",
+            "Summary\n",
+            "Analyte,Concentration\n",
+            ",ppb\n",
+            "acetone,1.5\n",
+            "ammonia,2.5\n",
+            "ethanol,9.0\n",
+            "isoprene,3.5\n",
+            "lactic acid,4.5\n",
+            "not read,x\n",
+        ]
+
+        self.assertEqual(readMetaboliteSummary(lines), {
+            'acetone': 1.5,
+            'ammonia': 2.5,
+            'isoprene': 3.5,
+            'lactic acid': 4.5,
+        })
+
+    def test_incomplete_metabolite_summary(self):
+        self.assertIsNone(readMetaboliteSummary(["Header,1\n", "acetone,1.5\n"]))
+        self.assertIsNone(readMetaboliteSummary(["Summary\n", "a\n", "b\n", "acetone,1.5\n"]))
+
+    def test_mapped_scan_block(self):
+        rows = [[19, 20, 1.0, 3.0, ':', 'x'], [30, 31, 2.0, 4.0, ':', 'x']]
+        writeScanFile(self.path, rows)
+        with open(self.path, 'rb') as f:
+            windows = f.read().replace(b'\n', b'\r\n')
+        windowsPath = self.path + ".crlf"
+        with open(windowsPath, 'wb') as f:
+            f.write(windows)
+
+        for path in (self.path, windowsPath):
+            with mappedFile(path) as mapped:
+                offsets = lineOffsets(mapped)
+                self.assertEqual(len(offsets), SCAN_ROW_START + len(rows) + 1)
+                scan = parseScanBlockText(scanBlockText(mapped, offsets))
+
+            self.assertEqual(scanArrayToDict(scan), {(19, 20): [2.0], (30, 31): [3.0]})
+
+    def test_line_offsets_stop_at_the_block_end(self):
+        writeScanFile(self.path, [[19, 20, 1.0, ':', 'x']] * 5)
+
+        with mappedFile(self.path) as mapped:
+            offsets = lineOffsets(mapped, SCAN_ROW_START + 2)
+            self.assertEqual(len(offsets), SCAN_ROW_START + 3)
+            self.assertEqual(scanBlockText(mapped, offsets, SCAN_ROW_START, SCAN_ROW_START + 2), "19,20,1.0,:,x\n" * 2)
+            self.assertEqual(len(lineOffsets(mapped)), SCAN_ROW_START + 6)
+
+    def test_mapped_short_and_empty_files(self):
+        writeScanFile(self.path, [], preamble=10)
+        with mappedFile(self.path) as mapped:
+            self.assertIsNone(parseScanBlockText(scanBlockText(mapped, lineOffsets(mapped))))
+
+        open(self.path, 'w').close()
+        with mappedFile(self.path) as mapped:
+            self.assertIsNone(parseScanBlockText(scanBlockText(mapped, lineOffsets(mapped))))
+            self.assertIsNone(parseMetaboliteText(summaryText(mapped)))
+
+    def test_mapped_summary(self):
+        with open(self.path, 'w') as f:
+            f.write("Header,Summary of run\nSummary\nAnalyte,Concentration\n,ppb\n"
+                    "acetone,1.5\nammonia,2.5\nisoprene,3.5\nlactic acid,4.5\n")
+
+        with mappedFile(self.path) as mapped:
+            self.assertEqual(parseMetaboliteText(summaryText(mapped))['lactic acid'], 4.5)
+
+    def test_scan_block_problem(self):
+        cases = [
+            ([[19, 20, 1.0, ':', 'x'], [30, 31, 2.0, ':', 'x']], SCAN_ROW_START, None),
+            ([[19, 20, 1.0, ':', 'x'], ['', 31, 2.0, ':', 'x']], SCAN_ROW_START, "no reagent on line 268"),
+            ([[19, 20, 1.0, 'x']], SCAN_ROW_START, "no ':' column on line 267"),
+            ([], 10, "10 lines, the ion block starts at line 267"),
+        ]
+
+        for rows, preamble, problem in cases:
+            writeScanFile(self.path, rows, preamble)
+            with mappedFile(self.path) as mapped:
+                self.assertEqual(scanBlockProblem(mapped, lineOffsets(mapped)), problem)
+
+        open(self.path, 'w').close()
+        with mappedFile(self.path) as mapped:
+            self.assertEqual(scanBlockProblem(mapped, lineOffsets(mapped)), "empty file")
+
+    def test_summary_problem(self):
+        for text, problem in [
+            ("Summary\nacetone,1\nammonia,1\nisoprene,1\nlactic acid,1\n", None),
+            ("Header\nacetone,1\n", "no Summary section"),
+            ("Header\nSummary\nacetone,1\nammonia,1\nlactic acid,1\n", "no isoprene in the Summary section"),
+        ]:
+            with open(self.path, 'w') as f:
+                f.write(text)
+            with mappedFile(self.path) as mapped:
+                self.assertEqual(summaryProblem(mapped), problem)
@@ -0,0 +1,37 @@
+import random
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from al_syft import process_file, process_metabolite_file
+from input_catalog import InputCatalog
+from synthetic_exports import generateCohort, writeMetaboliteExport, writeScanExport
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cohort_is_found_and_parsed(self):
+        self.assertEqual(generateCohort(self.root / "root", 2), ["AL-01", "AL-02"])
+
+        clientFiles = InputCatalog.build(self.root / "root").client("AL-02")
+        self.assertEqual(len(clientFiles.baseline), 3)
+        self.assertEqual(sorted(minutes for _, minutes in clientFiles.massScans), [0, 30])
+        self.assertEqual(sorted(minutes for _, minutes in clientFiles.metabolites), [-3, 30])
+
+        # Less the four filtered ions
+        self.assertEqual(len(process_file(clientFiles.baseline[0])), 1158 - 4)
+        self.assertIsNotNone(process_metabolite_file(clientFiles.metabolites[0][0]))
+
+    def test_incomplete_exports(self):
+        rng = random.Random(0)
+        writeScanExport(self.root / "scan.csv", "AL-01", 30, rng, incomplete=True)
+        writeMetaboliteExport(self.root / "metabolite.csv", "AL-01", 30, rng, incomplete=True)
+
+        self.assertIsNone(process_file(self.root / "scan.csv"))
+        self.assertIsNone(process_metabolite_file(self.root / "metabolite.csv"))